@@ -1,4 +1,11 @@
-import importlib.metadata
-
-piki_version = importlib.metadata.version(__package__)
 piki_source_url = "https://github.com/goncalomb/piki"
+
+
+def __getattr__(name):
+    # resolved on first use, importlib.metadata is slow to import
+    if name == 'piki_version':
+        import importlib.metadata
+        global piki_version
+        piki_version = importlib.metadata.version(__package__)
+        return piki_version
+    raise AttributeError("module '%s' has no attribute '%s'" % (__name__, name))
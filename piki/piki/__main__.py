@@ -1,5 +1,28 @@
+import ast
 import importlib
 import importlib.metadata
+import importlib.util
+
+
+def _module_doc(name: str):
+    # read the docstring (or '__doc__ = ...') from the source, importing the
+    # entry point modules just for this is slow (urwid, evdev...)
+    try:
+        spec = importlib.util.find_spec(name)
+        with open(spec.origin, 'rb') as fp:
+            tree = ast.parse(fp.read())
+        if doc := ast.get_docstring(tree):
+            return doc
+        for node in tree.body:
+            if (
+                isinstance(node, ast.Assign) and
+                any(isinstance(t, ast.Name) and t.id == '__doc__' for t in node.targets) and
+                isinstance(node.value, ast.Constant)
+            ):
+                return node.value.value
+    except (ImportError, OSError, SyntaxError, TypeError):
+        pass
+    return importlib.import_module(name).__doc__
 
 
 def main():
@@ -14,7 +37,7 @@ def main():
         if ep.group == 'console_scripts':
             m = ep.value.split(':', 1)[0]
             m_no_main = m[:-9] if m.endswith('.__main__') else m
-            m_doc = importlib.import_module(m).__doc__
+            m_doc = _module_doc(m)
             print('  %s OR python3 -m %s : %s' % (ep.name, m_no_main, m_doc))
     print()
 
@@ -3,10 +3,11 @@ import os
 import shutil
 import subprocess
 import sys
+import time
 
 import click
 
-from . import CoreController
+from . import paths
 
 __doc__ = 'PiKi core program.'
 
@@ -26,9 +27,14 @@ def main():
 
 
 @main.command(help="Run piki-core (to be run as service connected to a tty).")
-def run():
+@click.option('--max-fps', type=click.FloatRange(min=0), default=30, show_default=True, help="Maximum frame rate for the plugin draw requests (0 for no limit).")
+def run(max_fps):
     logging.basicConfig(level=logging.INFO)
-    CoreController().run()
+    # imported here, the other commands don't need the core, the import is
+    # the first startup phase
+    startup_time = time.perf_counter()
+    from .controller import CoreController
+    CoreController(startup_time, max_fps=max_fps).run()
 
 
 @main.group(help="Debug utilities.")
@@ -42,6 +48,7 @@ def _():
         restart_piki_core()
     except Exception as e:
         print(e, file=sys.stderr)
+        sys.exit(1)
 
 
 @debug.command(name='send-plugin', help="Write/Update plugin file over SSH to a remote piki installation.")
@@ -61,6 +68,7 @@ def _(file, ssh_args, piki_dir, name, restart):
             ] + (['-r', name] if restart else [name]), stdin=fp)
     except Exception as e:
         print(e, file=sys.stderr)
+        sys.exit(1)
 
 
 @debug.command(name='write-plugin', help="Write/Update plugin file from STDIN, use over SSH or with 'send-plugin'.")
@@ -68,7 +76,7 @@ def _(file, ssh_args, piki_dir, name, restart):
 @click.option('-r', '--restart', is_flag=True, help="Also restart piki-core.")
 def _(name, restart):
     try:
-        piki_plugins_dir = CoreController.piki_plugins_dir
+        piki_plugins_dir = paths.piki_plugins_dir
         path = os.path.join(piki_plugins_dir, name)
         print('writing: %s' % path, file=sys.stderr)
         with open(path, 'wb') as fp:
@@ -77,6 +85,63 @@ def _(name, restart):
             restart_piki_core()
     except Exception as e:
         print(e, file=sys.stderr)
+        sys.exit(1)
+
+
+@debug.command(name='deploy', help="Write/Update plugin files on many remote piki installations (INVENTORY file, one host per line) concurrently.")
+@click.argument('inventory')
+@click.argument('files', required=True, nargs=-1, type=click.Path(exists=True, dir_okay=False))
+@click.option('-d', '--piki-dir', default='/opt/piki', help="Remote piki installation location (piki_dir).")
+@click.option('-j', '--jobs', default=8, type=click.IntRange(1), help="Number of hosts deployed at the same time.")
+@click.option('-r', '--restart', is_flag=True, help="Also restart piki-core.")
+@click.option('-t', '--timeout', type=click.FloatRange(min=0), default=60, show_default=True, help="Timeout for each command in seconds (0 for no timeout).")
+@click.option('--transport', type=click.Choice(['ssh', 'local']), default='ssh', help="Run the commands over ssh or locally (testing).")
+@click.option('--ssh-arg', 'ssh_args', multiple=True, help="Extra ssh argument for all hosts, repeatable.")
+@click.option('--local-root', help="Local transport, run each host on its own directory (DIR/<host>).")
+@click.option('--piki-core', help="Remote piki-core command, defaults to PIKI_DIR/bin/piki-core (required with the local transport).")
+def _(inventory, files, piki_dir, jobs, restart, timeout, transport, ssh_args, local_root, piki_core):
+    import asyncio
+    import shlex
+
+    from ..utils.fleet import (LocalFleetTransport, SSHFleetTransport,
+                               fleet_deploy, fleet_read_inventory)
+
+    if transport == 'local' and not piki_core:
+        # the default would be this machine's own piki-core (restart, etc.)
+        print("--piki-core is required with the local transport", file=sys.stderr)
+        sys.exit(1)
+    try:
+        hosts = fleet_read_inventory(inventory)
+    except OSError as e:
+        print(e, file=sys.stderr)
+        sys.exit(1)
+    if transport == 'ssh':
+        ft = SSHFleetTransport(ssh_args=ssh_args)
+    else:
+        ft = LocalFleetTransport(local_root)
+
+    def cb_result(res):
+        if res.ok:
+            print('ok      %-24s %6.2fs' % (res.host.name, res.elapsed))
+            return
+        print('FAILED  %-24s %6.2fs %s' % (res.host.name, res.elapsed, res.error))
+        if res.steps and res.steps[-1].output:
+            for line in res.steps[-1].output.splitlines()[-3:]:
+                print('          %s' % line)
+
+    print('deploying %d file(s) to %d host(s), %d at a time' % (len(files), len(hosts), jobs), file=sys.stderr)
+    t = time.perf_counter()
+    results = asyncio.run(fleet_deploy(
+        hosts, list(files),
+        transport=ft,
+        piki_core=shlex.split(piki_core) if piki_core else [os.path.join(piki_dir, 'bin', 'piki-core')],
+        restart=restart, jobs=jobs, timeout=timeout or None,
+        cb_result=cb_result,
+    ))
+    failed = sum(1 for res in results if not res.ok)
+    print('done: %d ok, %d failed, %.2fs' % (len(results) - failed, failed, time.perf_counter() - t), file=sys.stderr)
+    if failed:
+        sys.exit(1)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,233 @@
+import asyncio
+import gc
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import urwid
+
+from ..plugin import Plugin
+from ..utils.bench import bench_stats
+from ..utils.pkg import evdev
+from ..utils.pkg.urwid import ConfigurableMenu, HeadlessScreen
+from ..utils.pkg.urwid_window import WindowFlags
+from ..utils.plugin import load_plugins
+from . import ui
+from .controller import CoreController, InputController
+
+# benchmarks that require piki.core, imported lazily by 'piki-utils bench'
+
+_bench_plugin_source = '''
+from piki.plugin import Plugin
+
+
+class BenchPlugin(Plugin):
+    def on_load(self):
+        self.count = 0
+        self.evt.input_key.on(self._on_key)
+
+    def _on_key(self, ev):
+        self.count += 1
+'''
+
+
+def _bench_input_batches(n: int, size: int):
+    # key presses as read from a keyboard, (MSC_SCAN, EV_KEY, SYN_REPORT)
+    # for each key, alternating down and up
+    ecodes = evdev.ecodes
+    keys = [ecodes.KEY_UP, ecodes.KEY_DOWN, ecodes.KEY_ENTER, ecodes.KEY_ESC, 0x2ff]
+    batches = []
+    i = 0
+    for b in range(n):
+        batch = []
+        for _ in range(max(1, size // 3)):
+            key = keys[i // 2 % len(keys)]
+            sec, usec = divmod(i * 1000, 1000000)
+            batch.append(evdev.InputEvent(sec, usec, ecodes.EV_MSC, ecodes.MSC_SCAN, key))
+            batch.append(evdev.InputEvent(sec, usec, ecodes.EV_KEY, key, 1 - i % 2))
+            batch.append(evdev.InputEvent(sec, usec, ecodes.EV_SYN, ecodes.SYN_REPORT, 0))
+            i += 1
+        batches.append(batch)
+    return batches
+
+
+def bench_input(plugins=10, batches=2000, batch_size=6, warmup=100):
+    """
+    Drive synthetic event batches through InputController.decode and
+    CoreController._input_key (urwid alarm) to N dummy plugins.
+    """
+    evs_batches = _bench_input_batches(batches + warmup, batch_size)
+
+    async def run():
+        ctl = CoreController()
+        ctl._loop_ctl._event_loop = urwid.AsyncioEventLoop(loop=asyncio.get_running_loop())
+        with tempfile.TemporaryDirectory(prefix='piki-bench-') as path:
+            for i in range(plugins):
+                with open(os.path.join(path, 'bench_%03d.py' % i), 'w') as fp:
+                    fp.write(_bench_plugin_source)
+            ctl._plugins = load_plugins(path, Plugin, ctl._cb_plugin_init)
+        for p in ctl._plugins:
+            p.on_load()
+
+        latencies = []
+        state = {'t': 0.0, 'pending': 0, 'record': False, 'future': None}
+
+        def probe(ev):
+            # last handler of the last plugin, the event reached all plugins
+            if state['record']:
+                latencies.append(time.perf_counter() - state['t'])
+            state['pending'] -= 1
+            if not state['pending']:
+                state['future'].set_result(None)
+
+        ctl._plugins[-1].evt.input_key.on(probe)
+        n_keys = [sum(1 for ev in evs if ev.type == evdev.ecodes.EV_KEY) for evs in evs_batches]
+
+        async def feed(i):
+            state['pending'] = n_keys[i]
+            state['future'] = asyncio.get_running_loop().create_future()
+            state['t'] = time.perf_counter()
+            InputController.decode(evs_batches[i], ctl._input_key)
+            await state['future']
+
+        for i in range(warmup):
+            await feed(i)
+
+        # throughput and latency
+        state['record'] = True
+        t = time.perf_counter()
+        for i in range(warmup, warmup + batches):
+            await feed(i)
+        elapsed = time.perf_counter() - t
+        state['record'] = False
+        n_events = sum(map(len, evs_batches[warmup:]))
+
+        # allocations, peak traced memory above the baseline of each batch
+        # and blocks still allocated after the run (leaks/caches)
+        alloc = []
+        gc.collect()
+        blocks = sys.getallocatedblocks()
+        tracemalloc.start()
+        try:
+            for i in range(warmup, warmup + batches):
+                tracemalloc.reset_peak()
+                base = tracemalloc.get_traced_memory()[0]
+                await feed(i)
+                alloc.append((tracemalloc.get_traced_memory()[1] - base) / len(evs_batches[i]))
+        finally:
+            tracemalloc.stop()
+        gc.collect()
+        blocks = sys.getallocatedblocks() - blocks
+
+        return {
+            'events': n_events,
+            'dispatched': sum(p.count for p in ctl._plugins),
+            'events_per_s': n_events / elapsed,
+            'dispatch_latency': bench_stats(latencies),
+            'alloc_bytes_per_event': sum(alloc) / len(alloc) if alloc else 0.0,
+            'blocks_retained_per_event': blocks / n_events if n_events else 0.0,
+        }
+
+    return asyncio.run(run())
+
+
+class _BenchFrames():
+    # per frame timings, named phases plus the render and canvas (screen) times
+    def __init__(self, screen: HeadlessScreen):
+        self._screen = screen
+        self._times: dict[str, list[float]] = {}
+
+    def time(self, name: str, fn):
+        t = time.perf_counter()
+        res = fn()
+        self._times.setdefault(name, []).append(time.perf_counter() - t)
+        return res
+
+    def frame(self, w: urwid.Widget, prefix=''):
+        size = self._screen.get_cols_rows()
+        canvas = self.time(prefix + 'render', lambda: w.render(size, focus=True))
+        self.time(prefix + 'canvas', lambda: self._screen.draw_screen(size, canvas))
+
+    def stats(self):
+        return {name: bench_stats(times) for name, times in self._times.items()}
+
+
+def bench_ui(size=(80, 24), overlays=8, buttons=500, frames=50):
+    """
+    Render the core ui on a headless screen, window manager with stacked
+    overlay windows, big menus, message boxes and full ui resets.
+    """
+
+    async def run():
+        screen = HeadlessScreen(size)
+        ctl = CoreController()
+        ctl._loop_ctl._event_loop = urwid.AsyncioEventLoop(loop=asyncio.get_running_loop())
+        screen.register_palette(ctl._loop_ctl._default_palette())
+        results = {}
+
+        # window manager with N stacked overlay windows, each frame swaps
+        # the two top windows (window change, the manager updates), then a
+        # cached frame
+        bf = _BenchFrames(screen)
+        wm = ctl._loop_ctl._wm
+        wds = [wm.root.make_window(urwid.ListBox(urwid.SimpleListWalker([
+            urwid.Text('window %d line %d' % (i, n)) for n in range(20)
+        ])), title='Window %d' % i, overlay={
+            'width': ('relative', 80),
+            'height': ('relative', 75),
+        }) for i in range(overlays)]
+        for i in range(frames):
+            bf.time('update', wds[-2 + i % 2].set_active)
+            bf.frame(ctl._loop_ctl._w_root)
+            bf.frame(ctl._loop_ctl._w_root, 'cached_')
+        results['wm_overlays'] = bf.stats()
+        for wd in list(wm.root.children):
+            wd.close()
+
+        # menu with a big button list, replaced every frame (new callbacks,
+        # all the buttons change)
+        bf = _BenchFrames(screen)
+        menu = ConfigurableMenu('piki.menu')
+        menu.menu_setup_root(buttons=[('Bench', 'bench')])
+        menu.menu_setup('bench')
+        menu._menu_push('bench')
+        for _ in range(frames):
+            labels = [('Button %d' % i, lambda: None) for i in range(buttons)]
+            bf.time('menu_setup', lambda: menu.menu_setup('bench', buttons=labels))
+            bf.frame(menu)
+        results['menu_setup'] = bf.stats()
+
+        # one button appended to the big menu every frame
+        bf = _BenchFrames(screen)
+        for i in range(frames):
+            bf.time('menu_append', lambda: menu.menu_setup(
+                'bench', buttons=[('Append %d' % i, lambda: None)], replace=False,
+            ))
+            bf.frame(menu)
+        results['menu_append'] = bf.stats()
+
+        # message box, open, render and close
+        bf = _BenchFrames(screen)
+        for _ in range(frames):
+            wd = bf.time('open', lambda: wm.root.make_window(
+                ui.message_box('Benchmark message.', buttons='Yes,No'),
+                title='Message', flags=WindowFlags.DEFAULT_NO_CLOSE, overlay=True,
+            ))
+            bf.frame(ctl._loop_ctl._w_root)
+            bf.time('close', wd.close)
+        results['message_box'] = bf.stats()
+
+        # full ui reset, with the internal plugins
+        bf = _BenchFrames(screen)
+        ctl._load_plugins()
+        for _ in range(frames):
+            bf.time('ui_reset', ctl._ui_reset)
+            bf.frame(ctl._loop_ctl._w_root)
+        ctl._unload_plugins()
+        results['ui_reset'] = bf.stats()
+
+        return results
+
+    return asyncio.run(run())
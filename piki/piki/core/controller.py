@@ -0,0 +1,589 @@
+import asyncio
+import logging
+import os
+import subprocess
+import time
+
+import evdev
+import urwid
+
+from .. import piki_version
+from ..plugin import Plugin, PluginControl, PluginEvents, UIFrameStats, UIInternals
+from ..utils.linux.inotify import InotifyWatcher
+from ..utils.linux.input import input_find_devices
+from ..utils.linux.netlink import netlink_monitor
+from ..utils.pkg.evdev import evdev_open_device
+from ..utils.pkg.urwid import ConfigurableMenu, ss_make_default_palette
+from ..utils.pkg.urwid_window import Window, WindowFlags, WindowManager
+from ..utils.plugin import load_plugins
+from . import paths, ui
+
+# same logger as before the controller was moved out of 'piki.core'
+logger = logging.getLogger(__package__)
+
+
+# ui_notify levels, toast attributes
+_notify_attrs = {
+    'info': 'ss.cyan.bg',
+    'warning': 'ss.yellow.bg',
+    'error': 'ss.red.bg',
+}
+
+
+class UILoopController():
+    def __init__(self, max_fps: float = 30):
+        self._main_loop = None
+        self._event_loop = None
+        # frame scheduler, see draw_screen
+        self.max_fps = max_fps
+        self.frame_stats = UIFrameStats()
+        self._frame_handle = None
+        self._frame_time = 0.0
+        self._first_frame = None
+        self._ui_reset()
+
+    @property
+    def asyncio_loop(self):
+        # XXX: we are accessing urwid internals here (_loop)
+        return self._event_loop._loop
+
+    @property
+    def internals(self):
+        return UIInternals(self._main_loop, self._w_root, self._wm, self._wd_menu, self._w_frame, self._w_menu)
+
+    def _default_palette(self):
+        for p in ss_make_default_palette():
+            yield p
+        yield 'piki.menu.button.label', '', ''
+        yield 'piki.menu.button/focus.label', 'standout', ''
+        yield 'piki.menu.button.wrap', '', '',
+        yield 'piki.menu.button/focus.wrap', 'dark cyan', ''
+
+    def _ui_reset(self):
+        # hotkeys (registered on 'on_ui_create'), key -> callbacks, and the
+        # compiled table used by the input filter
+        self._hotkeys: dict[str, list] = {}
+        self._hotkey_table: dict[str, tuple] = {}
+        self._w_menu = ConfigurableMenu('piki.menu')
+        self._w_frame = urwid.Frame(self._w_menu)
+        self._wm = WindowManager(cb_call_later=self._call_later)
+        self._wd_menu = self._wm.root.make_window(
+            self._w_frame,
+            title='PiKi Menu',
+            flags=WindowFlags.DEFAULT_NO_CLOSE,
+        )
+        self._w_root = urwid.WidgetPlaceholder(self._wm.widget)
+        if (self._main_loop):
+            self._main_loop.widget = self._w_root
+            self._main_loop.screen.register_palette(self._default_palette())
+
+    def _call_later(self, delay, callback):
+        # urwid alarm (redraws after the callback), None before the loop
+        return self._event_loop.alarm(delay, callback) if self._event_loop else None
+
+    def hotkey_add(self, key: str, callback):
+        self._hotkeys.setdefault(key, []).append(callback)
+        self._hotkey_table = {k: tuple(cbs) for k, cbs in self._hotkeys.items()}
+
+    def hotkey_remove(self, key: str, callback):
+        if callback in (cbs := self._hotkeys.get(key, [])):
+            cbs.remove(callback)
+            if not cbs:
+                del self._hotkeys[key]
+            self._hotkey_table = {k: tuple(cbs) for k, cbs in self._hotkeys.items()}
+
+    def _input_filter(self, keys, raw):
+        # hotkeys, before the widgets (mouse events are tuples)
+        if not self._hotkey_table:
+            return keys
+        return [key for key in keys if not (isinstance(key, str) and self._hotkey(key))]
+
+    def _hotkey(self, key: str):
+        # the first callback not returning False handles the key
+        for cb in self._hotkey_table.get(key, ()):
+            if cb() is not False:
+                return True
+        return False
+
+    def draw_screen(self):
+        """
+        Schedule a frame, all the requests until the frame is drawn are
+        coalesced, frames are limited to 'max_fps' (0 for no limit).
+        """
+        if not self._main_loop:
+            return
+        self.frame_stats.requests += 1
+        if self._frame_handle:
+            self.frame_stats.skipped += 1
+            return
+        delay = 0.0
+        if self.max_fps > 0:
+            delay = max(0.0, self._frame_time + 1 / self.max_fps - time.monotonic())
+        self._frame_handle = self.asyncio_loop.call_later(delay, self._main_loop.draw_screen)
+
+    def _draw_screen(self):
+        # all the draws (scheduled frames and urwid redraws after input,
+        # alarms...), a pending frame is not needed after a draw
+        if self._frame_handle:
+            self._frame_handle.cancel()
+            self._frame_handle = None
+        t = time.monotonic()
+        urwid.MainLoop.draw_screen(self._main_loop)
+        self._frame_time = time.monotonic()
+        self.frame_stats._add_frame(self._frame_time - t)
+        if self._first_frame:
+            first_frame, self._first_frame = self._first_frame, None
+            first_frame()
+
+    def _run(self, main, unhandled_input, first_frame=None):
+        self._event_loop = urwid.AsyncioEventLoop()
+        self._event_loop.alarm(0, main)
+
+        self._main_loop = urwid.MainLoop(
+            self._w_root, self._default_palette(),
+            event_loop=self._event_loop,
+            unhandled_input=unhandled_input,
+            input_filter=self._input_filter,
+        )
+
+        self._first_frame = first_frame
+        self._main_loop.draw_screen = self._draw_screen
+
+        self._main_loop.run()
+
+
+class InputController():
+    @staticmethod
+    def decode(evs, input_key):
+        # key down/up events only (no repeat), also used by the benchmarks
+        for ev in evs:
+            if ev.type == evdev.ecodes.EV_KEY and ev.value in [0, 1]:
+                names = evdev.ecodes.keys[ev.code] if ev.code in evdev.ecodes.keys else '0x%02x' % ev.code
+                input_key(PluginEvents.InputKeyEvent(
+                    ev.code,
+                    (names,) if isinstance(names, str) else names,
+                    'down' if ev.value else 'up',
+                ))
+
+    def start(self, input_key):
+        def get_relevant_devices():
+            # find all input devices that declare at least one KEY capability
+            for dev in input_find_devices():
+                if dev.uevent_var('KEY', '0') != '0' and dev.event0:
+                    yield dev.event0
+
+        # TODO: more error handling
+        # TODO: properly detect when devices are connected/disconnected,
+        #       detecting new devices requires a NETLINK_KOBJECT_UEVENT socket
+        #       this is how libs like libinput/libudev work, we could just
+        #       use libinput, but i think it's a good exercise to explore the
+        #       netlink kernel sockets and expand our piki.utils.linux package
+        # TODO: we could also rewrite the evdev package in pure python...
+
+        async def read_device(dev):
+            try:
+                event_io = evdev_open_device(dev)
+                logger.info("Reading input events from '%s'" % dev.dev_path)
+                while evs := await event_io.async_read():
+                    self.decode(evs, input_key)
+            except OSError as e:
+                logger.warning("Error reading device '%s'" % dev.dev_path)
+                logger.warning(e)
+
+        loop = asyncio.get_running_loop()
+        for dev in get_relevant_devices():
+            loop.create_task(read_device(dev))
+
+    def stop(self):
+        # TODO: proper cleanup, just let the tasks be cancelled by
+        #       the loop shutdown for now
+        pass
+
+
+class NetworkController():
+    def __init__(self):
+        self._state = None
+        self._task = None
+
+    @property
+    def state(self):
+        return self._state
+
+    def start(self, network_change):
+        def cb_start(state):
+            self._state = state
+            logger.info("Monitoring network, %d link(s), %d address(es)" % (
+                len(state.links), len(state.addresses),
+            ))
+
+        async def monitor():
+            try:
+                await netlink_monitor(
+                    lambda state, change: network_change(
+                        PluginEvents.NetworkEvent(state, change),
+                    ),
+                    cb_start=cb_start,
+                )
+            except OSError as e:
+                logger.warning("Error monitoring network")
+                logger.warning(e)
+
+        self._task = asyncio.get_running_loop().create_task(monitor())
+
+    def stop(self):
+        # see InputController.stop
+        pass
+
+
+class CoreController():
+    piki_venv_dir = paths.piki_venv_dir
+    piki_dir = paths.piki_dir
+    piki_plugins_dir = paths.piki_plugins_dir
+    piki_plugins_internal_dir = paths.piki_plugins_internal_dir
+    piki_cache_dir = paths.piki_cache_dir
+
+    def __init__(self, startup_time: float | None = None, *, max_fps: float = 30):
+        # startup phases, logged on the first frame, 'startup_time' is the
+        # time.perf_counter() before the core imports
+        self._startup_t = time.perf_counter()
+        self._startup = [('imports', self._startup_t - (startup_time or self._startup_t))]
+        self._plugins = []  # TODO: type hinting on 'utils.plugin'
+        self._loop_ctl = UILoopController(max_fps)
+        self._event_ctl = InputController()
+        self._network_ctl = NetworkController()
+        self._watcher = None
+        self._watch_plugins = None
+
+    @property
+    def watcher(self):
+        # shared by all plugins, created on first use (requires event loop),
+        # callbacks from urwid alarms (the screen is redrawn after)
+        if not self._watcher:
+            self._watcher = InotifyWatcher(cb_call_later=self._loop_ctl._call_later)
+        return self._watcher
+
+    def _startup_phase(self, name: str):
+        now = time.perf_counter()
+        self._startup.append((name, now - self._startup_t))
+        self._startup_t = now
+
+    def _first_frame(self):
+        self._startup_phase('first_frame')
+        logger.info("Startup: %s, total %.1fms" % (
+            ', '.join('%s %.1fms' % (name, t * 1e3) for name, t in self._startup),
+            sum(t for _, t in self._startup) * 1e3,
+        ))
+
+    def _cb_plugin_init(self, p):
+        p.ctl = PluginControlImpl(self)
+        p.evt = PluginEventsImpl()
+
+    def _cb_plugin_internal_init(self, p):
+        self._cb_plugin_init(p)
+        p.internal = True
+        p.name = 'internal:' + p.name
+
+    def _load_plugins(self):
+        logger.info("Loading plugins")
+
+        self._plugins = load_plugins(
+            self.piki_plugins_internal_dir,
+            Plugin,
+            self._cb_plugin_internal_init,
+        )
+        # TODO: add some way to sort plugins, 'order' field?
+        #       for now just sort by name (internal only)
+        self._plugins.sort(key=lambda p: p.name, reverse=True)
+
+        if os.path.isdir(self.piki_plugins_dir):
+            self._plugins += load_plugins(
+                self.piki_plugins_dir,
+                Plugin,
+                self._cb_plugin_init,
+            )
+        else:
+            logger.warning("Plugins directory does't exist")
+
+        for p in self._plugins:
+            p.on_load()
+
+        logger.info("Loaded %d plugin(s): %s" % (
+            len(self._plugins),
+            [p.name for p in self._plugins],
+        ))
+        self._startup_phase('plugins')
+
+        for p in self._plugins:
+            p.on_ui_create()
+        self._startup_phase('ui_create')
+
+    def _unload_plugins(self):
+        logger.info("Unloading plugins")
+
+        for p in self._plugins:
+            p.on_ui_destroy()
+
+        for p in self._plugins:
+            p.on_unload()
+
+    def _ui_reset(self):
+        for p in self._plugins:
+            p.on_ui_destroy()
+
+        self._loop_ctl._ui_reset()
+
+        for p in self._plugins:
+            p.on_ui_create()
+
+    def _plugins_changed(self, path, mask):
+        logger.info("Plugin file changed '%s', restart to apply" % path)
+
+    def _main(self):
+        self._event_ctl.start(self._input_key)
+        self._network_ctl.start(self._network_change)
+        if os.path.isdir(self.piki_plugins_dir):
+            self._watch_plugins = self.watcher.watch(
+                self.piki_plugins_dir, self._plugins_changed, delay=0.5,
+            )
+        for p in self._plugins:
+            p.on_main()
+
+    def _unhandled_input(self, data):
+        for p in self._plugins:
+            p.evt.input_urwid.fire(PluginEvents.InputUrwidEvent(data))
+        return True
+
+    def _input_key(self, ev):
+        def cb():
+            for p in self._plugins:
+                p.evt.input_key.fire(ev)
+        self._loop_ctl._event_loop.alarm(0, cb)
+
+    def _network_change(self, ev):
+        def cb():
+            for p in self._plugins:
+                p.evt.network.fire(ev)
+        self._loop_ctl._event_loop.alarm(0, cb)
+
+    def run(self):
+        logger.info("Starting PiKi v%s" % piki_version)
+        logger.info("piki_venv_dir = %s" % self.piki_venv_dir)
+        logger.info("piki_dir = %s" % self.piki_dir)
+        logger.info("piki_plugins_dir = %s" % self.piki_plugins_dir)
+
+        self._load_plugins()
+
+        try:
+            self._loop_ctl._run(self._main, self._unhandled_input, self._first_frame)
+        except KeyboardInterrupt:
+            pass
+        except Exception as e:
+            logger.exception("Uncaught exception", exc_info=e)
+
+        self._unload_plugins()
+
+        logger.info("Frames: %s" % self._loop_ctl.frame_stats.summary())
+
+        if self._watcher:
+            self._watcher.close()
+
+        # because urwid uses run_forever internally we do some extra
+        # cleanup here, similarly to what the default runner does
+        # https://github.com/python/cpython/blob/main/Lib/asyncio/runners.py
+        # https://docs.python.org/3/library/asyncio-eventloop.html#asyncio.loop.close
+        loop = self._loop_ctl.asyncio_loop
+        try:
+            tasks = asyncio.tasks.all_tasks(loop)
+            if tasks:
+                logger.info("Cancelling %s pending task(s)" % len(tasks))
+                for task in tasks:
+                    task.cancel()
+                loop.run_until_complete(asyncio.gather(
+                    *tasks, return_exceptions=True,
+                ))
+            logger.info("Stopping")
+            loop.run_until_complete(loop.shutdown_asyncgens())
+            loop.run_until_complete(loop.shutdown_default_executor())
+        finally:
+            asyncio.set_event_loop(None)
+            loop.close()
+
+        logger.info("End")
+
+
+class PluginControlImpl(PluginControl):
+    def __init__(self, ctl: CoreController):
+        self._core_ctl = ctl
+        self._loop_ctl = ctl._loop_ctl
+
+    def sys_exec(self, args, check=True, output=False):
+        return subprocess.run(
+            args,
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.PIPE if output else subprocess.DEVNULL,
+            stderr=subprocess.PIPE if output else subprocess.DEVNULL,
+            check=check,
+            text=True,
+        )
+
+    def sys_reboot(self):
+        try:
+            self.sys_exec(['sudo', '-n', 'reboot'])
+            return True
+        except (FileNotFoundError, subprocess.SubprocessError):
+            return False
+
+    def sys_poweroff(self):
+        try:
+            self.sys_exec(['sudo', '-n', 'poweroff'])
+            return True
+        except (FileNotFoundError, subprocess.SubprocessError):
+            return False
+
+    def sys_watch_path(self, path, callback, *, recursive=False, delay=0.1):
+        return self._core_ctl.watcher.watch(
+            path, callback, recursive=recursive, delay=delay,
+        )
+
+    @property
+    def sys_network(self):
+        return self._core_ctl._network_ctl.state
+
+    @property
+    def loop_asyncio(self):
+        return self._loop_ctl.asyncio_loop
+
+    def loop_call_later(self, delay, callback):
+        return self._loop_ctl._event_loop.alarm(delay, callback)
+
+    def loop_stop(self):
+        def cb():
+            raise urwid.ExitMainLoop()
+        self.loop_call_later(0, cb)
+        # raise urwid.ExitMainLoop()
+
+    @property
+    def ui_internals(self):
+        return self._loop_ctl.internals
+
+    def ui_draw_screen(self):
+        self._loop_ctl.draw_screen()
+
+    @property
+    def ui_frame_stats(self):
+        return self._loop_ctl.frame_stats
+
+    def ui_reset(self):
+        self.loop_call_later(0, self._core_ctl._ui_reset)
+
+    def ui_hotkey_add(self, key, callback):
+        self._loop_ctl.hotkey_add(key, callback)
+
+    def ui_hotkey_remove(self, key, callback):
+        self._loop_ctl.hotkey_remove(key, callback)
+
+    def ui_menu_setup(self, key, *, title=None, buttons=..., append=True, replace=True):
+        self.ui_draw_screen()
+        self._loop_ctl._w_menu.menu_setup(
+            key,
+            title=title, buttons=buttons, append=append, replace=replace,
+        )
+
+    def ui_menu_setup_source(self, key, source, *, title=None):
+        self.ui_draw_screen()
+        self._loop_ctl._w_menu.menu_setup_source(
+            key, source, title=title, cb_draw_screen=self.ui_draw_screen,
+        )
+
+    def ui_menu_source_refresh(self, key):
+        self.ui_draw_screen()
+        self._loop_ctl._w_menu.menu_source_refresh(key)
+
+    def ui_menu_setup_root(self, *, title=None, buttons=..., append=False, replace=False):
+        self.ui_draw_screen()
+        self._loop_ctl._w_menu.menu_setup_root(
+            title=title, buttons=buttons, append=append, replace=replace,
+        )
+
+    def ui_menu_remove(self, key):
+        self.ui_draw_screen()
+        self._loop_ctl._w_menu.menu_remove(key)
+
+    def ui_batch(self):
+        return self._loop_ctl._wm.batch()
+
+    def ui_window_open(self, *args, **kwargs):
+        self._loop_ctl._wm.root.open_window(*args, **kwargs)
+
+    def ui_window_make(self, *args, **kwargs):
+        return self._loop_ctl._wm.root.make_window(*args, **kwargs)
+
+    def ui_window_close_top(self):
+        wd_top = self._loop_ctl._wm.root.first_child
+        if wd_top:
+            wd_top.close()
+
+    def ui_window_close_all(self):
+        with self._loop_ctl._wm.batch():
+            for wd in list(self._loop_ctl._wm.root.children):
+                wd.close()
+
+    def ui_notify(self, text, *, level='info', timeout=None):
+        self.ui_draw_screen()
+        self._loop_ctl._wm.notify(text, attr=_notify_attrs.get(level, level), timeout=timeout)
+
+    def ui_message_box(
+        self, body, *,
+        buttons='OK',
+        callback=None,
+        autoclose=True,
+        parent: Window | None = None,
+        title='',
+    ):
+        if buttons == 'OK' and not callback and isinstance(body, str):
+            # no answer needed, a toast instead of a stacked window
+            self.ui_notify('%s: %s' % (title, body) if title else body)
+            return None
+        wd_p = self._loop_ctl._wm.root
+        if parent and parent.is_open:
+            wd_p = parent
+        elif self._loop_ctl._wd_menu.is_open:
+            wd_p = self._loop_ctl._wd_menu
+        return wd_p.make_window(
+            ui.message_box(
+                body,
+                buttons=buttons,
+                callback=callback,
+                autoclose=autoclose,
+            ),
+            title=title,
+            flags=WindowFlags.DEFAULT_NO_CLOSE,
+            overlay=True,
+        )
+
+
+class PluginEventsImpl(PluginEvents):
+    class Handlers(PluginEvents.Handlers):
+        def __init__(self):
+            self._handlers = set()
+
+        def on(self, cb):
+            self._handlers.add(cb)
+
+        def off(self, cb):
+            # copy to avoid changing the set while iterating
+            self._handlers = set(self._handlers)
+            self._handlers.discard(cb)
+
+        def fire(self, ev):
+            for h in self._handlers:
+                h(ev)
+
+    input_urwid: Handlers
+    input_key: Handlers
+    network: Handlers
+
+    def __init__(self):
+        self.input_urwid = self.Handlers()
+        self.input_key = self.Handlers()
+        self.network = self.Handlers()
@@ -0,0 +1,12 @@
+import os
+
+from ..utils import venv_find_dir
+
+# piki installation directories, kept apart from the controller so that the
+# light commands (e.g. 'debug write-plugin') don't import the whole core
+
+piki_venv_dir = venv_find_dir()
+piki_dir = os.path.dirname(piki_venv_dir) if piki_venv_dir else os.getcwd()
+piki_plugins_dir = os.path.join(piki_dir, 'plugins')
+piki_cache_dir = os.path.join(piki_dir, 'cache')
+piki_plugins_internal_dir = os.path.join(os.path.dirname(__file__), 'plugins')
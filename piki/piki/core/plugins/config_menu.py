@@ -5,7 +5,9 @@ from piki.core import CoreController
 from piki.plugin import Plugin
 from piki.utils.linux.rc import RCDevice, rc_find_devices
 from piki.utils.pkg.urwid_window import Window
-from piki.utils.rc_keytable import RCKeymap, RCKeymapConfigurator
+from piki.utils.rc_keytable import (RCKeymap, RCKeymapConfigurator,
+                                   rc_device_apply_keymap,
+                                   rc_device_narrow_protocols)
 
 
 class RCKeymapConfiguratorWindow(Window):
@@ -16,7 +18,7 @@ class RCKeymapConfiguratorWindow(Window):
 
         self._keymap = RCKeymap()
         if os.path.isfile(self._file):
-            self._keymap.load(self._file)
+            self._keymap.load(self._file, CoreController.piki_cache_dir)
             # XXX: not handling errors
 
         self._cfg = RCKeymapConfigurator(
@@ -59,16 +61,21 @@ class RCKeymapConfiguratorWindow(Window):
         if self._cfg.changed:
             # XXX: don't trim, ir-keytable fails with 'Segmentation fault'
             #      with empty rc map files 'ir-keytable -a /etc/rc_maps.cfg'
-            self._keymap.save(self._file, trim=False)
+            self._keymap.save(self._file, trim=False, cache_dir=CoreController.piki_cache_dir)
+            self._plugin._narrow_protocols(self._cfg._dev, self._keymap)
             self._msg_saved()
         else:
             self._close_force()
 
     def _msg_saved(self):
+        if not self._cfg._dev:
+            self._msg_reboot('Saved, a reboot is required for the changes to take effect. Reboot now?')
+            return
         self._plugin.ctl.ui_message_box(
-            'Saved, a reboot is required for the changes to take effect. Reboot now?',
+            'Saved, apply the changes now?',
             buttons=[
-                ('Reboot', 'ss.cyan', lambda *_: self._plugin.ctl.sys_reboot()),
+                ('Apply now', 'ss.cyan', lambda *_: self._apply()),
+                ('Reboot', 'ss.white', lambda *_: self._plugin.ctl.sys_reboot()),
                 ('No', 'ss.white'),
             ],
             callback=lambda *_: self._close_force(),
@@ -76,6 +83,27 @@ class RCKeymapConfiguratorWindow(Window):
             title='RC/IR Configurator',
         )
 
+    def _msg_reboot(self, message):
+        self._plugin.ctl.ui_message_box(
+            message,
+            buttons=[
+                ('Reboot', 'ss.cyan', lambda *_: self._plugin.ctl.sys_reboot()),
+                ('No', 'ss.white'),
+            ],
+            callback=lambda *_: self._close_force(),
+            parent=self if self.is_open else None,
+            title='RC/IR Configurator',
+        )
+
+    def _apply(self):
+        if self._plugin._apply_keymap(self._cfg._dev, self._keymap):
+            self._plugin.ctl.ui_notify('RC/IR Configurator: changes applied')
+        else:
+            # later, after this window is closed by the message box callback
+            self._plugin.ctl.loop_call_later(0, lambda: self._msg_reboot(
+                'Failed to apply the changes, reboot instead?',
+            ))
+
     def _msg_ask(self):
         self._plugin.ctl.ui_message_box(
             'Not saved, close anyway?',
@@ -97,12 +125,54 @@ class RCKeymapConfiguratorWindow(Window):
 
 
 class ConfigMenuPlugin(Plugin):
-    def _rpi_config_rc(self):
+    _rpi_rc_file = os.path.join(CoreController.piki_dir, 'rc-empty.toml')
+
+    def _rpi_rc_device(self):
         def is_rpi_rc(dev: RCDevice):
             return dev.lirc0 is not None and dev.uevent_var('DRV_NAME') == 'gpio_ir_recv' and dev.uevent_var('NAME') == 'rc-empty'
-        file = os.path.join(CoreController.piki_dir, 'rc-empty.toml')
-        dev = next(filter(is_rpi_rc, rc_find_devices()), None)
-        self.ctl.ui_window_open(RCKeymapConfiguratorWindow(self, file, dev))
+        return next(filter(is_rpi_rc, rc_find_devices()), None)
+
+    def _rpi_config_rc(self):
+        dev = self._rpi_rc_device()
+        self.ctl.ui_window_open(RCKeymapConfiguratorWindow(self, self._rpi_rc_file, dev))
+
+    def _narrow_protocols(self, dev: RCDevice | None, keymap: RCKeymap):
+        # disable the kernel decoders not used by any configured remote
+        if not dev:
+            return
+        try:
+            enabled, disabled = rc_device_narrow_protocols(dev, keymap)
+            self.logger.info("RC protocols on '%s': enabled %s, disabled %d decoder(s)" % (
+                dev.path, enabled, disabled,
+            ))
+        except OSError as e:
+            self.logger.warning("Failed to set RC protocols on '%s'" % dev.path)
+            self.logger.warning(e)
+
+    def _apply_keymap(self, dev: RCDevice, keymap: RCKeymap):
+        # load the keymap into the kernel, no reboot required
+        try:
+            changed, removed = rc_device_apply_keymap(dev, keymap)
+            self.logger.info("RC keymap applied to '%s': %d set, %d removed" % (
+                dev.path, changed, removed,
+            ))
+            return True
+        except (OSError, RuntimeError) as e:
+            self.logger.warning("Failed to apply RC keymap to '%s'" % dev.path)
+            self.logger.warning(e)
+            return False
+
+    def on_main(self):
+        if not os.path.isfile(self._rpi_rc_file):
+            return
+        keymap = RCKeymap()
+        try:
+            keymap.load(self._rpi_rc_file, CoreController.piki_cache_dir)
+        except Exception as e:
+            self.logger.warning("Failed to load '%s'" % self._rpi_rc_file)
+            self.logger.warning(e)
+            return
+        self._narrow_protocols(self._rpi_rc_device(), keymap)
 
     def on_ui_create(self):
         self.ctl.ui_menu_setup_root(buttons=[
@@ -1,6 +1,7 @@
 import urwid
 from piki import piki_source_url, piki_version
 from piki.plugin import Plugin
+from piki.utils.pkg.urwid import CachedWidget
 from piki.utils.pkg.urwid_window import TitleBarWS, WindowFlags
 
 
@@ -34,13 +35,13 @@ class DefaultStylePlugin(Plugin):
         ui.w_frame.body = urwid.Padding(
             ui.w_frame.body, 'center', ('relative', 45),
         )
-        # create header and footer pile
-        ui.w_frame.header = urwid.Filler(urwid.Pile([
+        # create header and footer pile (static)
+        ui.w_frame.header = CachedWidget(urwid.Filler(urwid.Pile([
             urwid.Padding(urwid.BigText(
                 self._title, urwid.HalfBlock5x4Font(),
             ), 'center', 'clip'),
             urwid.Text(self._header_message, 'center'),
-        ]), top=1, bottom=1)
-        ui.w_frame.footer = urwid.Filler(urwid.Pile([
+        ]), top=1, bottom=1))
+        ui.w_frame.footer = CachedWidget(urwid.Filler(urwid.Pile([
             urwid.Text(self._footer_message, 'center'),
-        ]), top=1, bottom=1)
+        ]), top=1, bottom=1))
@@ -2,6 +2,7 @@ import subprocess
 
 import urwid
 from piki.plugin import Plugin
+from piki.utils.linux.netlink import netlink_dump_state
 from piki.utils.pkg.urwid import (ss_16color_names, ss_attr_map_style,
                                   ss_make_boxbutton, ss_make_button)
 from piki.utils.pkg.urwid_window import Window
@@ -19,13 +20,15 @@ class JournalLogWindow(Window):
             'comm: %s, ' % self._comm if self._comm else '',
             self._max_entries,
         )
+        # built when shown, released (and the log read again) when hidden
         super().__init__(
-            self._make_widget(),
+            lambda wd: wd._make_widget(),
             title=title,
             overlay={
                 'width': ('relative', 95),
                 'height': ('relative', 85),
             },
+            release_after=30,
         )
 
     def _journal_entries(self):
@@ -85,6 +88,17 @@ class SystemMenuPlugin(Plugin):
             text = self.ctl.sys_exec(args, output=True).stdout.strip()
             text = '\n'.join(map(lambda x: '  ' + x, text.split('\n')))
             return urwid.Text(text)
+
+        def net_text():
+            # from the netlink monitor, or a one-time dump if not available
+            state = self.ctl.sys_network or netlink_dump_state()
+            lines = ['  %s: %s/%d' % (
+                state.link_name(a.index), a.address, a.prefixlen,
+            ) for a in state.global_addresses()]
+            lines += ['  default via %s dev %s' % (
+                r.gateway, state.link_name(r.oif),
+            ) for r in state.default_routes()]
+            return urwid.Text('\n'.join(lines) or '  (no addresses)')
         try:
             contents = [
                 urwid.Text(('ss.cyan.fg', 'uname -a')),
@@ -93,12 +107,12 @@ class SystemMenuPlugin(Plugin):
                 cmd_text(['uptime']),
                 urwid.Text(('ss.cyan.fg', 'free --si -ht')),
                 cmd_text(['free', '--si', '-ht']),
-                urwid.Text(('ss.cyan.fg', 'hostname -I')),
-                cmd_text(['hostname', '-I']),
+                urwid.Text(('ss.cyan.fg', 'network')),
+                net_text(),
                 urwid.Text(('ss.cyan.fg', 'df -H')),
                 cmd_text(['df', '-H']),
             ]
-        except (FileNotFoundError, subprocess.SubprocessError) as e:
+        except (OSError, subprocess.SubprocessError) as e:
             self.logger.exception('Error executing command.', exc_info=e)
             contents = [
                 urwid.Filler(
@@ -6,6 +6,8 @@ import typing
 import urwid
 
 from .utils import plugin as _plugin
+from .utils.linux import inotify as _inotify
+from .utils.linux import netlink as _netlink
 from .utils.pkg import urwid as _urwid
 from .utils.pkg import urwid_window as _urwid_window
 
@@ -20,6 +22,33 @@ class UIInternals():
     w_menu: _urwid.ConfigurableMenu
 
 
+@dataclasses.dataclass
+class UIFrameStats():
+    requests: int = 0
+    """ draw requests (ui_draw_screen) """
+    skipped: int = 0
+    """ draw requests coalesced into an already scheduled frame """
+    frames: int = 0
+    """ frames drawn (all draws, also urwid redraws after input) """
+    draw_time: float = 0.0
+    """ total draw time (seconds) """
+    draw_time_max: float = 0.0
+    """ slowest draw time (seconds) """
+
+    def summary(self):
+        return 'frames=%d requests=%d skipped=%d draw_time=%.1fms avg=%.2fms max=%.2fms' % (
+            self.frames, self.requests, self.skipped, self.draw_time * 1e3,
+            self.draw_time / self.frames * 1e3 if self.frames else 0.0,
+            self.draw_time_max * 1e3,
+        )
+
+    def _add_frame(self, t: float):
+        self.frames += 1
+        self.draw_time += t
+        if t > self.draw_time_max:
+            self.draw_time_max = t
+
+
 class PluginControl():
     def sys_exec(self, args: list[str], check=True, output=False) -> subprocess.CompletedProcess:
         """
@@ -37,6 +66,35 @@ class PluginControl():
         Power off the system.
         """
 
+    def sys_watch_path(
+        self, path: str, callback: typing.Callable[[str, int], typing.Any], *,
+        recursive=False,
+        delay: float = 0.1,
+    ) -> _inotify.InotifyWatch:
+        """
+        Watch a file or directory for changes (inotify), 'callback' is called
+        with the changed path and the inotify event mask. Bursts of events
+        are coalesced, 'callback' is called once per path after 'delay'.
+        The screen is redrawn after the callbacks (as with 'loop_call_later').
+
+        Use 'recursive' to also watch all the sub-directories. If the path
+        (or its directory) is removed or replaced, 'callback' gets the path
+        with IN_IGNORED and again with IN_CREATE when it's created again.
+        Returns a handle, call 'cancel' to stop watching.
+
+        The event loop must be available (e.g. call it from 'on_main').
+        """
+
+    @property
+    def sys_network(self) -> _netlink.NetworkState | None:
+        """
+        The current network state (links, addresses and routes), kept up to
+        date using netlink notifications (no polling). Use 'evt.network' to
+        get notified of changes.
+
+        It's None until the event loop starts (e.g. use it from 'on_main').
+        """
+
     @property
     def loop_asyncio(self) -> asyncio.AbstractEventLoop:
         """
@@ -69,6 +127,16 @@ class PluginControl():
         It's not required when changing the UI from 'on_ui_create', when
         calling other 'ctl.ui_XXX' functions, or when changing the UI from a
         'ctl.loop_call_later' callback.
+
+        Requests from all plugins are coalesced into one frame and limited
+        to the maximum frame rate (piki-core run --max-fps), it's cheap to
+        call on every update.
+        """
+
+    @property
+    def ui_frame_stats(self) -> UIFrameStats:
+        """
+        Frame statistics (frames drawn, coalesced requests, draw time).
         """
 
     def ui_reset(self):
@@ -77,6 +145,18 @@ class PluginControl():
         reset the internal UI widgets, and call 'on_ui_create' (all plugins).
         """
 
+    def ui_hotkey_add(self, key: str, callback: typing.Callable[[], typing.Any]):
+        """
+        Add a global hotkey (urwid key name, e.g. 'f1', 'ctrl r'), handled
+        before the widgets. The key is consumed unless 'callback' returns
+        False. Hotkeys are cleared on UI reset, add them on 'on_ui_create'.
+        """
+
+    def ui_hotkey_remove(self, key: str, callback: typing.Callable[[], typing.Any]):
+        """
+        Remove a global hotkey.
+        """
+
     def ui_menu_setup(
         self, key: str, *,
         title: str | None = None,
@@ -87,6 +167,20 @@ class PluginControl():
         Add/Configure menu.
         """
 
+    def ui_menu_setup_source(
+        self, key: str, source: _urwid.MenuSource, *,
+        title: str | None = None,
+    ):
+        """
+        Add/Replace a menu backed by a data source (e.g. thousands of
+        entries), the entries are fetched in pages as they are shown.
+        """
+
+    def ui_menu_source_refresh(self, key: str):
+        """
+        Refresh a data source menu, after 'source.invalidate()'.
+        """
+
     def ui_menu_setup_root(
         self, *,
         title: str | None = None,
@@ -102,6 +196,12 @@ class PluginControl():
         Remove menu.
         """
 
+    def ui_batch(self) -> typing.ContextManager[_urwid_window.WindowManager]:
+        """
+        Batch window changes, use 'with ctl.ui_batch():' to open/close/modify
+        multiple windows, the windows are only rendered once (at the end).
+        """
+
     def ui_window_open(
         self, wd: _urwid_window.Window, *,
         active=True,
@@ -132,6 +232,18 @@ class PluginControl():
         Close all windows.
         """
 
+    def ui_notify(
+        self, text: str, *,
+        level: typing.Literal['info', 'warning', 'error'] | str = 'info',
+        timeout: float | None = None,
+    ):
+        """
+        Show a notification toast (no buttons), expires after 'timeout'
+        seconds (default 5). Repeated messages are coalesced with a count,
+        prefer it over 'ui_message_box' for messages that need no answer.
+        'level' can also be a palette attribute.
+        """
+
     def ui_message_box(
         self, body, *,
         buttons='OK',
@@ -139,9 +251,11 @@ class PluginControl():
         autoclose=True,
         parent: _urwid_window.Window | None = None,
         title='',
-    ) -> _urwid_window.Window:
+    ) -> _urwid_window.Window | None:
         """
-        Open message box.
+        Open message box. Text messages with only the default 'OK' button
+        and no callback need no answer, they are shown as a notification
+        toast (see 'ui_notify') and None is returned.
         """
 
 
@@ -161,6 +275,11 @@ class PluginEvents():
         names: tuple[str]
         state: typing.Literal['down', 'up']
 
+    @dataclasses.dataclass(frozen=True)
+    class NetworkEvent():
+        state: _netlink.NetworkState
+        change: _netlink.NetChange
+
     class Handlers(typing.Generic[_ev_T]):
         def on(self, cb: typing.Callable[[_ev_T], typing.Any]):
             """ Add event handler callback. """
@@ -184,6 +303,14 @@ class PluginEvents():
     until piki-core is restarted.
     """
 
+    network: Handlers[NetworkEvent]
+    """
+    Network change events (links, addresses and routes), from a netlink
+    (NETLINK_ROUTE) socket.
+
+    https://man7.org/linux/man-pages/man7/rtnetlink.7.html
+    """
+
 
 class Plugin(_plugin.Plugin):
     """
@@ -1,9 +1,9 @@
-import importlib.metadata
 import os
 import sys
 
 
 def pkg_find_version(name: str, unknown=None):
+    import importlib.metadata
     try:
         return importlib.metadata.version(name)
     except ModuleNotFoundError:
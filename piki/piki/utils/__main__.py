@@ -1,53 +1,97 @@
-
 import asyncio
 import contextlib
+import functools
+import sys
 
 import click
 
+from .event_writer import EventWriter
+from .input_monitor import input_event_filter, input_monitor, input_print_device
+from .linux.input import event_find_devices, input_find_devices
 from .linux.rc import rc_find_devices
-from .rc_monitor import rc_monitor, rc_print_device, rc_print_ev, rc_print_sc
+from .linux.sysfs import sysfs_set_root
+from .linux.sysfs_fake import sysfs_fake_make_tree
+from .rc_monitor import rc_monitor, rc_print_device
 
 __doc__ = 'PiKi utility program.'
 
 
-async def rc_monitor_run(dev, no_lirc, no_input):
-    if no_lirc:
-        print("INFO: not monitoring lirc device by request")
-    elif not dev.lirc0:
-        print("WARNING: not monitoring lirc device, no interface")
-        no_lirc = True
+async def rc_monitor_run(devs, no_lirc, no_input, format='text', stats=0.0):
+    # keep stdout clean for machine-readable formats
+    log = functools.partial(print, file=sys.stdout if format == 'text' else sys.stderr)
+    writer = EventWriter(format)
 
-    if no_input:
-        print("INFO: not monitoring input device by request")
-    elif not dev.input0 or not dev.input0.event0:
-        print("WARNING: not monitoring input device, no interface")
-        no_input = True
+    def check(dev):
+        d_no_lirc, d_no_input = no_lirc, no_input
+        name = dev.path.split('/')[-1]
+        if no_lirc:
+            log("INFO: %s: not monitoring lirc device by request" % name)
+        elif not dev.lirc0:
+            log("WARNING: %s: not monitoring lirc device, no interface" % name)
+            d_no_lirc = True
 
-    if no_lirc and no_input:
-        print()
-        print('nothing to do')
-        return
+        if no_input:
+            log("INFO: %s: not monitoring input device by request" % name)
+        elif not dev.input0 or not dev.input0.event0:
+            log("WARNING: %s: not monitoring input device, no interface" % name)
+            d_no_input = True
+
+        return d_no_lirc, d_no_input
 
     def cb_start(dev, stop, proto_org, proto_err):
         proto_now = map(lambda x: x[0], filter(lambda x: x[1], dev.protocols))
         if proto_err:
-            print("WARNING: failed to enable all rc protocols, permission denied")
-        print("enabled rc protocols:", ', '.join(proto_now))
-        print("monitoring", dev.path, "(CTRL-C to exit)")
-        print()
+            log("WARNING: failed to enable all rc protocols, permission denied")
+        log("enabled rc protocols:", ', '.join(proto_now))
+        log("monitoring", dev.path, "(CTRL-C to exit)")
+        log()
 
-    with contextlib.suppress(asyncio.CancelledError):
-        await rc_monitor(
+    def monitor(dev, d_no_lirc, d_no_input):
+        device = writer.add_device(dev.path.split('/')[-1])
+        return rc_monitor(
             dev,
-            cb_lirc=None if no_lirc else lambda d, stop, sc: rc_print_sc(sc),
-            cb_event=None if no_input else lambda d, stop, ev: rc_print_ev(ev),
+            cb_lirc=None if d_no_lirc else lambda d, stop, sc: writer.write_sc(device, sc),
+            cb_event=None if d_no_input else lambda d, stop, ev: writer.write_ev(device, ev),
             cb_start=cb_start,
+            cb_flush=lambda d: writer.flush(),
         )
 
+    tasks = []
+    for dev in devs:
+        d_no_lirc, d_no_input = check(dev)
+        if not (d_no_lirc and d_no_input):
+            tasks.append(monitor(dev, d_no_lirc, d_no_input))
+
+    if not tasks:
+        log()
+        log('nothing to do')
+        return
+
+    stats_task = asyncio.create_task(writer.run_stats(stats)) if stats > 0 else None
+    try:
+        with contextlib.suppress(asyncio.CancelledError):
+            # all devices on the same loop
+            await asyncio.gather(*tasks)
+    finally:
+        if stats_task:
+            stats_task.cancel()
+        writer.flush()
+
 
 @click.group(help=__doc__)
-def main():
-    pass
+@click.option('--sys-root', envvar='PIKI_SYSFS_ROOT', help="Use another sysfs root (default: /sys).")
+@click.option('--dev-root', envvar='PIKI_DEV_ROOT', help="Use another dev root (default: /dev).")
+def main(sys_root, dev_root):
+    sysfs_set_root(sys_root, dev_root)
+
+
+@main.command(name='fake-sysfs', help="Create a synthetic sysfs/dev tree (use with --sys-root and --dev-root).")
+@click.argument('directory')
+@click.option('--rc', default=1, help="Number of rc devices.")
+@click.option('--input', default=0, help="Number of extra input devices.")
+def _(directory, rc, input):
+    sys_root, dev_root = sysfs_fake_make_tree(directory, rc=rc, input=input)
+    print('--sys-root=%s --dev-root=%s' % (sys_root, dev_root))
 
 
 @main.group(help="Utilities to manage remote controller (rc) devices.")
@@ -62,23 +106,198 @@ def _():
 
 
 @rc.command(name='monitor', help="Monitor rc device events.")
-@click.argument('device')
+@click.argument('device', required=False)
+@click.option('--all', 'all_devs', is_flag=True, help="Monitor all rc devices.")
 @click.option('--no-lirc', is_flag=True, help="Don't monitor lirc events.")
 @click.option('--no-input', is_flag=True, help="Don't monitor input events.")
-def _(device, no_lirc, no_input):
+@click.option('--format', type=click.Choice(EventWriter.formats), default='text', help="Output format.")
+@click.option('--stats', default=0.0, help="Print an event rate and drop summary every N seconds (to stderr).")
+def _(device, all_devs, no_lirc, no_input, format, stats):
     def find_dev():
         for dev in rc_find_devices():
             if dev.path == device or dev.path.split('/')[-1] == device:
                 return dev
 
     ctx = click.get_current_context()
-    dev = find_dev()
-    if not dev:
+    if all_devs:
+        if device:
+            ctx.fail("Use DEVICE or --all, not both.")
+        devs = list(rc_find_devices())
+        if not devs:
+            ctx.fail("No rc devices found.")
+    elif not device:
+        ctx.fail("Missing DEVICE (or --all).")
+    elif dev := find_dev():
+        devs = [dev]
+    else:
         ctx.fail("Device '%s' not found, use /sys/class/rc/rcX or just rcX." % device)
 
-    rc_print_device(dev)
-    print()
-    asyncio.run(rc_monitor_run(dev, no_lirc, no_input))
+    if format == 'text':
+        for dev in devs:
+            rc_print_device(dev)
+            print()
+    with contextlib.suppress(BrokenPipeError):
+        asyncio.run(rc_monitor_run(devs, no_lirc, no_input, format, stats))
+
+
+@main.group(help="Utilities to inspect input (evdev) devices.")
+def input():
+    pass
+
+
+@input.command(name='list', help="List input devices and their capabilities.")
+@click.option('-v', '--verbose', is_flag=True, help="Show all the capability codes.")
+def _(verbose):
+    for dev in input_find_devices():
+        input_print_device(dev, verbose)
+
+
+@input.command(name='monitor', help="Monitor input device events.")
+@click.argument('devices', nargs=-1)
+@click.option('--all', 'all_devs', is_flag=True, help="Monitor all event devices.")
+@click.option('--type', 'types', multiple=True, help="Only events of this type (e.g. EV_KEY), repeatable.")
+@click.option('--code', 'codes', multiple=True, help="Only events with this code (e.g. KEY_A), repeatable.")
+@click.option('--format', type=click.Choice(EventWriter.formats), default='text', help="Output format.")
+@click.option('--stats', default=0.0, help="Print an event rate and drop summary every N seconds (to stderr).")
+def _(devices, all_devs, types, codes, format, stats):
+    ctx = click.get_current_context()
+    try:
+        ev_filter = input_event_filter(types, codes)
+    except ValueError as e:
+        ctx.fail(str(e))
+
+    # event devices by any of their names (eventX, inputX, /dev/..., /sys/...)
+    found = {}
+    for dev in input_find_devices():
+        for d in dev.event:
+            for name in (d.path, d.path.split('/')[-1], d.dev_path, dev.path, dev.path.split('/')[-1]):
+                found.setdefault(name, []).append(d)
+
+    if all_devs:
+        if devices:
+            ctx.fail("Use DEVICES or --all, not both.")
+        devs = list(event_find_devices())
+        if not devs:
+            ctx.fail("No event devices found.")
+    elif not devices:
+        ctx.fail("Missing DEVICES (or --all).")
+    else:
+        devs = []
+        for device in devices:
+            if device not in found:
+                ctx.fail("Device '%s' not found, use eventX, inputX or a device path." % device)
+            devs.extend(d for d in found[device] if d not in devs)
+
+    # keep stdout clean for machine-readable formats
+    log = functools.partial(print, file=sys.stdout if format == 'text' else sys.stderr)
+    writer = EventWriter(format)
+    device_index = {}
+
+    def cb_event(dev, stop, ev):
+        if not ev_filter or ev_filter(ev):
+            writer.write_ev(device_index[dev], ev)
+
+    def cb_start(devs, stop):
+        if not devs:
+            log('nothing to do')
+            return
+        for dev in devs:
+            device_index[dev] = writer.add_device(dev.path.split('/')[-1])
+        log("monitoring", ', '.join(d.dev_path for d in devs), "(CTRL-C to exit)")
+        log()
+
+    def cb_error(dev, err):
+        log("WARNING: not monitoring %s, %s" % (dev.dev_path, err))
+
+    async def run():
+        stats_task = asyncio.create_task(writer.run_stats(stats)) if stats > 0 else None
+        try:
+            with contextlib.suppress(asyncio.CancelledError):
+                await input_monitor(
+                    devs, cb_event=cb_event, cb_start=cb_start,
+                    cb_flush=lambda d: writer.flush(), cb_error=cb_error,
+                )
+        finally:
+            if stats_task:
+                stats_task.cancel()
+            writer.flush()
+
+    with contextlib.suppress(BrokenPipeError):
+        asyncio.run(run())
+
+
+@main.group(help="Benchmarks.")
+def bench():
+    pass
+
+
+@bench.command(name='discovery', help="Benchmark device discovery (on a synthetic sysfs tree).")
+@click.option('--rc', default=1, help="Number of rc devices.")
+@click.option('--input', default=200, help="Number of extra input devices.")
+@click.option('--repeat', default=20, help="Number of runs.")
+@click.option('--profile', is_flag=True, help="Also profile (cProfile).")
+def _(rc, input, repeat, profile):
+    from .bench import (bench_discovery, bench_fake_sysfs_context,
+                        bench_print, bench_profile_context)
+    with bench_fake_sysfs_context(rc=rc, input=input):
+        print('devices: rc=%d input=%d' % (rc, input))
+        with bench_profile_context(profile):
+            results = bench_discovery(repeat)
+        for name, stats in results.items():
+            bench_print(name, stats)
+
+
+@bench.command(name='input', help="Benchmark input decode and dispatch to plugins (synthetic events).")
+@click.option('--plugins', default=10, type=click.IntRange(1), help="Number of dummy plugins.")
+@click.option('--batches', default=2000, type=click.IntRange(1), help="Number of event batches.")
+@click.option('--batch-size', default=6, type=click.IntRange(3), help="Events per batch (3 per key).")
+@click.option('--profile', is_flag=True, help="Also profile (cProfile).")
+@click.option('--save', help="Save the results to a JSON file.")
+@click.option('--compare', help="Compare with the results from a JSON file.")
+def _(plugins, batches, batch_size, profile, save, compare):
+    from ..core.bench import bench_input
+    from .bench import (bench_load, bench_print, bench_print_compare,
+                        bench_profile_context, bench_record, bench_save)
+    params = {'plugins': plugins, 'batches': batches, 'batch_size': batch_size}
+    print('plugins=%d batches=%d batch_size=%d' % (plugins, batches, batch_size))
+    with bench_profile_context(profile):
+        results = bench_input(plugins, batches, batch_size)
+    print('%-28s %.0f' % ('events/s', results['events_per_s']))
+    bench_print('dispatch latency', results['dispatch_latency'], unit='us', scale=1e6)
+    print('%-28s %.1f' % ('alloc bytes/event', results['alloc_bytes_per_event']))
+    print('%-28s %.3f' % ('blocks retained/event', results['blocks_retained_per_event']))
+    record = bench_record('input', params, results)
+    if save:
+        bench_save(save, record)
+    if compare:
+        bench_print_compare(bench_load(compare), record)
+
+
+@bench.command(name='ui', help="Benchmark the core ui rendering (headless screen).")
+@click.option('--cols', default=80, type=click.IntRange(10), help="Screen columns.")
+@click.option('--rows', default=24, type=click.IntRange(5), help="Screen rows.")
+@click.option('--overlays', default=8, type=click.IntRange(1), help="Number of stacked overlay windows.")
+@click.option('--buttons', default=500, type=click.IntRange(1), help="Number of menu buttons.")
+@click.option('--frames', default=50, type=click.IntRange(1), help="Number of frames per case.")
+@click.option('--profile', is_flag=True, help="Also profile (cProfile).")
+@click.option('--save', help="Save the results to a JSON file.")
+@click.option('--compare', help="Compare with the results from a JSON file.")
+def _(cols, rows, overlays, buttons, frames, profile, save, compare):
+    from ..core.bench import bench_ui
+    from .bench import (bench_load, bench_print, bench_print_compare,
+                        bench_profile_context, bench_record, bench_save)
+    params = {'cols': cols, 'rows': rows, 'overlays': overlays, 'buttons': buttons, 'frames': frames}
+    print('screen=%dx%d overlays=%d buttons=%d frames=%d' % (cols, rows, overlays, buttons, frames))
+    with bench_profile_context(profile):
+        results = bench_ui((cols, rows), overlays, buttons, frames)
+    for case, phases in results.items():
+        for phase, stats in phases.items():
+            bench_print('%s.%s' % (case, phase), stats)
+    record = bench_record('ui', params, results)
+    if save:
+        bench_save(save, record)
+    if compare:
+        bench_print_compare(bench_load(compare), record)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,159 @@
+import contextlib
+import cProfile
+import datetime
+import json
+import os
+import platform
+import pstats
+import subprocess
+import tempfile
+import time
+import typing
+
+from .linux.input import input_find_devices
+from .linux.rc import rc_find_devices
+from .linux.sysfs import sysfs_get_root, sysfs_set_root
+from .linux.sysfs_fake import sysfs_fake_make_tree
+
+
+def bench_percentile(values: list[float], p: float):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    i = min(len(values) - 1, max(0, round(p / 100 * (len(values) - 1))))
+    return values[i]
+
+
+def bench_stats(values: list[float]):
+    return {
+        'n': len(values),
+        'min': min(values) if values else 0.0,
+        'mean': sum(values) / len(values) if values else 0.0,
+        'p50': bench_percentile(values, 50),
+        'p99': bench_percentile(values, 99),
+        'max': max(values) if values else 0.0,
+    }
+
+
+def bench_time(fn: typing.Callable[[], typing.Any], repeat=10):
+    times = []
+    for _ in range(repeat):
+        t = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - t)
+    return bench_stats(times)
+
+
+def bench_print(name: str, stats: dict, unit='ms', scale=1e3):
+    print('%-28s n=%-5d min=%.3f%s p50=%.3f%s p99=%.3f%s max=%.3f%s' % (
+        name, stats['n'],
+        stats['min'] * scale, unit, stats['p50'] * scale, unit,
+        stats['p99'] * scale, unit, stats['max'] * scale, unit,
+    ))
+
+
+@contextlib.contextmanager
+def bench_profile_context(enabled=True, limit=25):
+    if not enabled:
+        yield
+        return
+    prof = cProfile.Profile()
+    prof.enable()
+    try:
+        yield
+    finally:
+        prof.disable()
+        pstats.Stats(prof).sort_stats('cumulative').print_stats(limit)
+
+
+@contextlib.contextmanager
+def bench_fake_sysfs_context(*, rc=1, input=0):
+    roots = sysfs_get_root()
+    with tempfile.TemporaryDirectory(prefix='piki-sysfs-') as root:
+        sysfs_set_root(*sysfs_fake_make_tree(root, rc=rc, input=input))
+        try:
+            yield root
+        finally:
+            sysfs_set_root(*roots)
+
+
+def bench_discovery(repeat=10):
+    def rc_devices():
+        # same properties used by piki-utils and the configurator
+        for dev in rc_find_devices():
+            dev.lirc0 and dev.lirc0.dev_path
+            dev.input0 and dev.input0.event0 and dev.input0.event0.dev_path
+
+    def input_devices():
+        # same filter used by piki-core (InputController)
+        for dev in input_find_devices():
+            if dev.uevent_var('KEY', '0') != '0' and dev.event0:
+                dev.event0.dev_path
+
+    return {
+        'rc_find_devices': bench_time(rc_devices, repeat),
+        'input_find_devices': bench_time(input_devices, repeat),
+    }
+
+
+def bench_git_commit():
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            cwd=os.path.dirname(__file__), stderr=subprocess.DEVNULL, text=True,
+        ).strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def bench_record(suite: str, params: dict, results: dict):
+    """ Results with the environment, to compare runs across commits. """
+    from .. import piki_version
+    return {
+        'suite': suite,
+        'time': datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds'),
+        'piki_version': piki_version,
+        'git_commit': bench_git_commit(),
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'params': params,
+        'results': results,
+    }
+
+
+def bench_save(path: str, record: dict):
+    with open(path, 'w') as fp:
+        json.dump(record, fp, indent=2)
+        fp.write('\n')
+
+
+def bench_load(path: str):
+    with open(path) as fp:
+        return json.load(fp)
+
+
+def _bench_flatten(results: dict, prefix=''):
+    for k, v in results.items():
+        if isinstance(v, dict):
+            yield from _bench_flatten(v, prefix + k + '.')
+        elif isinstance(v, (int, float)):
+            yield prefix + k, v
+
+
+def bench_compare(old: dict, new: dict):
+    """ Yields (name, old, new, change %) for the numeric results. """
+    old_values = dict(_bench_flatten(old.get('results', {})))
+    for name, value in _bench_flatten(new.get('results', {})):
+        if name in old_values:
+            prev = old_values[name]
+            yield name, prev, value, (value - prev) / prev * 100 if prev else 0.0
+
+
+def bench_print_compare(old: dict, new: dict):
+    print('compare: %s (%s) -> %s (%s)' % (
+        old.get('git_commit'), old.get('time'), new.get('git_commit'), new.get('time'),
+    ))
+    if old.get('params') != new.get('params'):
+        print('WARNING: different parameters', old.get('params'), new.get('params'))
+    for name, prev, value, change in bench_compare(old, new):
+        print('  %-36s %12.4g -> %12.4g (%+.1f%%)' % (name, prev, value, change))
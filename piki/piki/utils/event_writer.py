@@ -0,0 +1,190 @@
+import asyncio
+import struct
+import sys
+import time
+import typing
+
+from .linux import rc
+from .pkg import evdev
+
+# streaming writers for lirc scancodes and input events, used by the monitor
+# commands, the output is buffered and flushed once per read batch
+#
+# formats:
+#   text: like rc_print_sc/rc_print_ev
+#   jsonl: one json object per line
+#   binary: 'PIKIEVT1' magic followed by 32 byte little-endian records
+#     device: u8 kind=0, u8 device, 6x, char name[24]
+#     lirc: u8 kind=1, u8 device, 6x, u64 timestamp (ns), u16 flags,
+#       u16 rc_proto, u32 keycode, u64 scancode (same as lirc_scancode)
+#     event: u8 kind=2, u8 device, 6x, u64 timestamp (ns), u16 type,
+#       u16 code, s32 value, 8x
+
+
+class _event_writer_binary():
+    MAGIC = b'PIKIEVT1'
+    KIND_DEVICE = 0
+    KIND_LIRC = 1
+    KIND_EVENT = 2
+    record_device = struct.Struct('<BB6x24s')
+    record_lirc = struct.Struct('<BB6xQHHIQ')
+    record_event = struct.Struct('<BB6xQHHi8x')
+
+
+def _code_name(names: dict, code: int):
+    name = names.get(code, '?')
+    return '/'.join(name) if isinstance(name, (list, tuple)) else name
+
+
+class EventWriterStats():
+    def __init__(self):
+        self.events = 0
+        self.dropped = 0
+        # per device (index)
+        self.devices: list[str] = []
+        self.device_events: list[int] = []
+        self._time = time.monotonic()
+        self._events = 0
+        self._dropped = 0
+        self._device_events: list[int] = []
+
+    def summary(self):
+        """ Event rate and drops since the last summary. """
+        now = time.monotonic()
+        elapsed = max(now - self._time, 1e-9)
+        text = 'events=%d rate=%.1f/s dropped=%d (total events=%d dropped=%d)' % (
+            self.events - self._events, (self.events - self._events) / elapsed,
+            self.dropped - self._dropped, self.events, self.dropped,
+        )
+        if len(self.devices) > 1:
+            # busiest devices first, to find the ones flooding
+            rates = sorted((
+                (n - self._device_events[i], self.devices[i])
+                for i, n in enumerate(self.device_events)
+            ), reverse=True)
+            text += ' ' + ' '.join('%s=%.1f/s' % (name, n / elapsed) for n, name in rates if n)
+        self._time = now
+        self._events = self.events
+        self._dropped = self.dropped
+        self._device_events = list(self.device_events)
+        return text
+
+    def _add_device(self, name: str):
+        self.devices.append(name)
+        self.device_events.append(0)
+        self._device_events.append(0)
+
+
+class EventWriter():
+    """
+    Write lirc scancodes and input events to a binary stream (stdout by
+    default), nothing is written until 'flush' is called (per batch).
+    """
+
+    formats = ('text', 'jsonl', 'binary')
+
+    def __init__(self, format='text', fp: typing.BinaryIO | None = None):
+        if format not in self.formats:
+            raise ValueError("Invalid format '%s'" % format)
+        if fp is None:
+            sys.stdout.flush()
+            fp = sys.stdout.buffer
+        self._format = format
+        self._fp = fp
+        self._buf: list[bytes] = []
+        self._devices: list[str] = []
+        self.stats = EventWriterStats()
+        if format == 'binary':
+            self._buf.append(_event_writer_binary.MAGIC)
+
+    @property
+    def format(self):
+        return self._format
+
+    def add_device(self, name: str):
+        """ Register a device, returns the device index used to write. """
+        if len(self._devices) > 0xff:
+            raise ValueError("Too many devices")
+        self._devices.append(name)
+        self.stats._add_device(name)
+        index = len(self._devices) - 1
+        if self._format == 'binary':
+            self._buf.append(_event_writer_binary.record_device.pack(
+                _event_writer_binary.KIND_DEVICE, index, name.encode()[:24],
+            ))
+        return index
+
+    def _text_dev(self, device: int):
+        # only shown when monitoring multiple devices
+        return ' dev=%s' % self._devices[device] if len(self._devices) > 1 else ''
+
+    def write_sc(self, device: int, sc: rc.LIRCScanCode):
+        self.stats.events += 1
+        self.stats.device_events[device] += 1
+        if self._format == 'binary':
+            self._buf.append(_event_writer_binary.record_lirc.pack(
+                _event_writer_binary.KIND_LIRC, device,
+                sc.timestamp, sc.flags, sc.rc_proto, sc.keycode, sc.scancode,
+            ))
+        elif self._format == 'jsonl':
+            self._buf.append((
+                '{"time":%d.%06d,"dev":"%s","src":"lirc","proto":"%s","rc_proto":%d,'
+                '"key":"%s","keycode":%d,"scancode":%d,"flags":[%s]}\n' % (
+                    sc.timestamp // 1000000000, sc.timestamp % 1000000000 // 1000,
+                    self._devices[device], sc.rc_proto_name, sc.rc_proto,
+                    _code_name(evdev.ecodes.keys, sc.keycode), sc.keycode, sc.scancode,
+                    ','.join('"%s"' % f for f in sc.flags_tuple),
+                )
+            ).encode())
+        else:
+            self._buf.append((
+                '%d.%06d: lirc proto=%s(0x%02x) keycode=%s(0x%04x) scancode=0x%04x flags=%s%s\n' % (
+                    sc.timestamp // 1000000000, sc.timestamp % 1000000000 // 1000,
+                    sc.rc_proto_name, sc.rc_proto,
+                    _code_name(evdev.ecodes.keys, sc.keycode), sc.keycode, sc.scancode,
+                    ','.join(sc.flags_tuple), self._text_dev(device),
+                )
+            ).encode())
+
+    def write_ev(self, device: int, ev: evdev.InputEvent):
+        self.stats.events += 1
+        self.stats.device_events[device] += 1
+        if ev.type == evdev.ecodes.EV_SYN and ev.code == evdev.ecodes.SYN_DROPPED:
+            # kernel buffer overrun, events were lost
+            self.stats.dropped += 1
+        if self._format == 'binary':
+            self._buf.append(_event_writer_binary.record_event.pack(
+                _event_writer_binary.KIND_EVENT, device,
+                ev.sec * 1000000000 + ev.usec * 1000, ev.type, ev.code, ev.value,
+            ))
+        elif self._format == 'jsonl':
+            self._buf.append((
+                '{"time":%d.%06d,"dev":"%s","src":"event","type_name":"%s","type":%d,'
+                '"code_name":"%s","code":%d,"value":%d}\n' % (
+                    ev.sec, ev.usec, self._devices[device],
+                    _code_name(evdev.ecodes.EV, ev.type), ev.type,
+                    _code_name(evdev.ecodes.bytype.get(ev.type, {}), ev.code), ev.code,
+                    ev.value,
+                )
+            ).encode())
+        else:
+            self._buf.append((
+                '%d.%06d: event type=%s(0x%02x) code=%s(0x%04x) value=0x%04x%s\n' % (
+                    ev.sec, ev.usec,
+                    _code_name(evdev.ecodes.EV, ev.type), ev.type,
+                    _code_name(evdev.ecodes.bytype.get(ev.type, {}), ev.code), ev.code,
+                    ev.value, self._text_dev(device),
+                )
+            ).encode())
+
+    def flush(self):
+        if self._buf:
+            buf, self._buf = self._buf, []
+            self._fp.write(b''.join(buf))
+        self._fp.flush()
+
+    async def run_stats(self, interval: float, file=sys.stderr):
+        """ Print a periodic event rate and drop summary (until cancelled). """
+        while True:
+            await asyncio.sleep(interval)
+            print('stats:', self.stats.summary(), file=file, flush=True)
@@ -0,0 +1,204 @@
+import abc
+import asyncio
+import dataclasses
+import os
+import shlex
+import shutil
+import signal
+import tempfile
+import time
+
+# deploy plugins to many piki installations concurrently, each host gets a
+# persistent connection (transport) and runs 'piki-core debug write-plugin'
+# for each file, then optionally 'piki-core debug restart'
+
+
+@dataclasses.dataclass
+class FleetHost():
+    name: str
+    args: list[str] = dataclasses.field(default_factory=list)
+
+
+@dataclasses.dataclass
+class FleetStep():
+    name: str
+    returncode: int
+    elapsed: float
+    output: str = ''
+
+
+@dataclasses.dataclass
+class FleetResult():
+    host: FleetHost
+    ok: bool = False
+    error: str | None = None
+    elapsed: float = 0.0
+    steps: list[FleetStep] = dataclasses.field(default_factory=list)
+
+
+def fleet_read_inventory(path: str):
+    """
+    Read an inventory file, one host per line, the host (ssh destination)
+    optionally followed by extra ssh arguments, '#' starts a comment.
+    """
+    hosts: list[FleetHost] = []
+    with open(path) as fp:
+        for line in fp:
+            args = shlex.split(line, comments=True)
+            if args:
+                hosts.append(FleetHost(args[0], args[1:]))
+    return hosts
+
+
+class FleetTransport(abc.ABC):
+    """ Runs commands on a host, 'open' and 'close' wrap all the commands. """
+
+    async def open(self, host: FleetHost):
+        pass
+
+    @abc.abstractmethod
+    async def run(self, host: FleetHost, args: list[str], stdin: bytes | None = None) -> tuple[int, bytes]:
+        pass
+
+    async def close(self, host: FleetHost):
+        pass
+
+    def cleanup(self):
+        pass
+
+    @staticmethod
+    async def _exec(args: list[str], stdin: bytes | None = None, **kwargs):
+        proc = await asyncio.create_subprocess_exec(
+            *args,
+            stdin=asyncio.subprocess.PIPE if stdin is not None else asyncio.subprocess.DEVNULL,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.STDOUT,
+            # own process group, to also kill the children on timeout
+            start_new_session=True,
+            **kwargs,
+        )
+        try:
+            output, _ = await proc.communicate(stdin)
+        except asyncio.CancelledError:
+            # timeout
+            try:
+                os.killpg(proc.pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+            await proc.wait()
+            raise
+        return proc.returncode, output
+
+
+class SSHFleetTransport(FleetTransport):
+    """
+    OpenSSH with a master connection per host (ControlMaster), the commands
+    reuse the connection instead of doing a new handshake each time.
+    """
+
+    def __init__(self, ssh='ssh', ssh_args: list[str] = []):
+        self._ssh = ssh
+        self._ssh_args = list(ssh_args)
+        # short path, unix socket paths are limited to ~108 bytes
+        self._control_dir = tempfile.mkdtemp(prefix='piki-fleet-')
+
+    def _args(self, host: FleetHost, *extra: str):
+        return [
+            self._ssh, '-o', 'ControlPath=%s' % os.path.join(self._control_dir, '%C'),
+            *self._ssh_args, *host.args, *extra, host.name,
+        ]
+
+    async def open(self, host):
+        # -f: background after authentication, -N: no command
+        code, output = await self._exec(self._args(
+            host, '-o', 'ControlMaster=yes', '-o', 'ControlPersist=yes',
+            '-o', 'BatchMode=yes', '-f', '-N',
+        ))
+        if code != 0:
+            raise ConnectionError(output.decode(errors='replace').strip() or 'ssh exit code %d' % code)
+
+    async def run(self, host, args, stdin=None):
+        return await self._exec(self._args(host, '-o', 'ControlMaster=no') + ['--', *map(shlex.quote, args)], stdin)
+
+    async def close(self, host):
+        await self._exec(self._args(host, '-O', 'exit'))
+
+    def cleanup(self):
+        shutil.rmtree(self._control_dir, ignore_errors=True)
+
+
+class LocalFleetTransport(FleetTransport):
+    """
+    Runs the commands locally, a stand-in for ssh (e.g. tests), with 'root'
+    each host runs in its own directory 'root/<host>' (a fake piki_dir).
+    """
+
+    def __init__(self, root: str | None = None):
+        self._root = root
+
+    async def open(self, host):
+        if self._root:
+            os.makedirs(os.path.join(self._root, host.name, 'plugins'), exist_ok=True)
+
+    async def run(self, host, args, stdin=None):
+        return await self._exec(
+            args, stdin,
+            cwd=os.path.join(self._root, host.name) if self._root else None,
+            env={**os.environ, 'PIKI_FLEET_HOST': host.name},
+        )
+
+
+async def fleet_deploy(
+    hosts: list[FleetHost], files: list[str], *,
+    transport: FleetTransport,
+    piki_core: list[str],
+    restart=False,
+    jobs=8,
+    timeout: float | None = 60,
+    cb_result=None,
+):
+    """
+    Deploy the plugin files to all the hosts, at most 'jobs' hosts at the
+    same time, 'piki_core' is the remote piki-core command. Returns the
+    results (same order as the hosts), 'cb_result' is called as they finish.
+    """
+    sem = asyncio.Semaphore(jobs)
+
+    async def step(result: FleetResult, name: str, args: list[str], stdin: bytes | None = None):
+        t = time.perf_counter()
+        code, output = await asyncio.wait_for(transport.run(result.host, args, stdin), timeout)
+        result.steps.append(FleetStep(
+            name, code, time.perf_counter() - t, output.decode(errors='replace').strip(),
+        ))
+        if code != 0:
+            raise RuntimeError('%s failed (exit code %d)' % (name, code))
+
+    async def deploy(host: FleetHost):
+        result = FleetResult(host)
+        async with sem:
+            t = time.perf_counter()
+            try:
+                await asyncio.wait_for(transport.open(host), timeout)
+                try:
+                    for name, data in contents:
+                        await step(result, name, piki_core + ['debug', 'write-plugin', name], data)
+                    if restart:
+                        await step(result, 'restart', piki_core + ['debug', 'restart'])
+                    result.ok = True
+                finally:
+                    await asyncio.wait_for(transport.close(host), timeout)
+            except (OSError, RuntimeError, asyncio.TimeoutError) as e:
+                result.error = str(e) or type(e).__name__
+            result.elapsed = time.perf_counter() - t
+        if cb_result:
+            cb_result(result)
+        return result
+
+    try:
+        contents = []
+        for path in files:
+            with open(path, 'rb') as fp:
+                contents.append((os.path.basename(path), fp.read()))
+        return await asyncio.gather(*map(deploy, hosts))
+    finally:
+        transport.cleanup()
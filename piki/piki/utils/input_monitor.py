@@ -0,0 +1,116 @@
+import asyncio
+import contextlib
+import typing
+
+from .linux import input
+from .pkg import evdev
+
+
+async def input_monitor(
+    devs: list[input.EventDevice], *, cb_event, cb_start=None, cb_flush=None, cb_error=None,
+):
+    with contextlib.ExitStack() as stack:
+        ios = []
+        for dev in devs:
+            try:
+                ios.append((dev, stack.enter_context(evdev.evdev_open_device(dev))))
+            except OSError as e:
+                # keep monitoring the other devices
+                if not cb_error:
+                    raise
+                cb_error(dev, e)
+
+        def stop():
+            # graceful stop
+            # internal cancelled futures are suppressed, see below
+            for _, event_io in ios:
+                event_io.close()
+
+        async def read_event(dev, event_io):
+            with contextlib.suppress(asyncio.CancelledError):
+                while evs := await event_io.async_read():
+                    for ev in evs:
+                        cb_event(dev, stop, ev)
+                    if cb_flush:
+                        cb_flush(dev)
+
+        if cb_start:
+            cb_start([dev for dev, _ in ios], stop)
+
+        await asyncio.gather(*(read_event(dev, event_io) for dev, event_io in ios))
+
+
+def _input_code_names():
+    names = {}
+    for t, codes in evdev.ecodes.bytype.items():
+        for code, name in codes.items():
+            for n in (name if isinstance(name, (list, tuple)) else (name, )):
+                names[n] = t, code
+    return names
+
+
+def input_event_filter(types: typing.Iterable[str] = (), codes: typing.Iterable[str] = ()):
+    """
+    Create an event filter (or None for no filter) from type names (EV_KEY
+    or just KEY) and code names (KEY_A, BTN_LEFT), numbers are also accepted.
+    SYN_DROPPED is always accepted, so drops are never hidden.
+    """
+    f_types = set()
+    for t in types:
+        if t.isdecimal():
+            f_types.add(int(t))
+        elif (n := t.upper()) in evdev.ecodes.ecodes or (n := 'EV_' + n) in evdev.ecodes.ecodes:
+            f_types.add(evdev.ecodes.ecodes[n])
+        else:
+            raise ValueError("Invalid event type '%s'" % t)
+
+    f_codes = set()
+    f_codes_any = set()
+    names = None
+    for c in codes:
+        if c.isdecimal():
+            f_codes_any.add(int(c))
+            continue
+        names = names or _input_code_names()
+        if c.upper() not in names:
+            raise ValueError("Invalid event code '%s'" % c)
+        f_codes.add(names[c.upper()])
+
+    if not f_types and not f_codes and not f_codes_any:
+        return None
+
+    ev_syn = evdev.ecodes.EV_SYN
+    syn_dropped = evdev.ecodes.SYN_DROPPED
+
+    def f(ev: evdev.InputEvent):
+        if ev.type == ev_syn and ev.code == syn_dropped:
+            return True
+        if f_types and ev.type not in f_types:
+            return False
+        if f_codes or f_codes_any:
+            return (ev.type, ev.code) in f_codes or ev.code in f_codes_any
+        return True
+    return f
+
+
+def input_print_device(dev: input.InputDevice, verbose=False):
+    print('%s:' % dev.path.split('/')[-1], dev.path)
+    for k, v in dev.uevent.items():
+        print('  %s=%s' % (k, v))
+    for d in dev.event:
+        print('  event: %s [%s] [%s]' % (d.path, d.dev_number, d.dev_path))
+    caps = input.input_device_capabilities(dev)
+    print('  capabilities:', ' '.join(
+        evdev.ecodes.EV.get(t, '0x%02x' % t) for t in caps.get('EV', [])
+    ) or '-')
+    for name, codes in caps.items():
+        if name == 'EV':
+            continue
+        if not verbose:
+            print('    EV_%s: %d code(s)' % (name, len(codes)))
+            continue
+        type_names = evdev.ecodes.bytype.get(evdev.ecodes.ecodes.get('EV_' + name), {})
+        print('    EV_%s:' % name, ' '.join(
+            n if isinstance(n := type_names.get(c, '0x%04x' % c), str) else '/'.join(n)
+            for c in codes
+        ))
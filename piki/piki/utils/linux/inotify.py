@@ -0,0 +1,422 @@
+import asyncio
+import contextlib
+import ctypes
+import ctypes.util
+import dataclasses
+import errno
+import os
+import typing
+
+# https://github.com/torvalds/linux/blob/master/include/uapi/linux/inotify.h
+# https://github.com/torvalds/linux/blob/master/fs/notify/inotify/inotify_user.c
+# https://man7.org/linux/man-pages/man7/inotify.7.html
+
+
+class _inotify():
+    IN_ACCESS = 0x00000001
+    IN_MODIFY = 0x00000002
+    IN_ATTRIB = 0x00000004
+    IN_CLOSE_WRITE = 0x00000008
+    IN_CLOSE_NOWRITE = 0x00000010
+    IN_OPEN = 0x00000020
+    IN_MOVED_FROM = 0x00000040
+    IN_MOVED_TO = 0x00000080
+    IN_CREATE = 0x00000100
+    IN_DELETE = 0x00000200
+    IN_DELETE_SELF = 0x00000400
+    IN_MOVE_SELF = 0x00000800
+    IN_UNMOUNT = 0x00002000
+    IN_Q_OVERFLOW = 0x00004000
+    IN_IGNORED = 0x00008000
+    IN_ONLYDIR = 0x01000000
+    IN_DONT_FOLLOW = 0x02000000
+    IN_EXCL_UNLINK = 0x04000000
+    IN_MASK_ADD = 0x20000000
+    IN_ISDIR = 0x40000000
+    IN_ONESHOT = 0x80000000
+    IN_CLOEXEC = os.O_CLOEXEC
+    IN_NONBLOCK = os.O_NONBLOCK
+
+
+class _inotify_event(ctypes.Structure):
+    _fields_ = [
+        ('wd', ctypes.c_int32),
+        ('mask', ctypes.c_uint32),
+        ('cookie', ctypes.c_uint32),
+        ('len', ctypes.c_uint32),
+        # char name[] (flexible array member, read separately)
+    ]
+
+
+# events that signal a change of content, used by default by InotifyWatcher
+INOTIFY_CHANGES = (
+    _inotify.IN_MODIFY | _inotify.IN_ATTRIB | _inotify.IN_CLOSE_WRITE |
+    _inotify.IN_MOVED_FROM | _inotify.IN_MOVED_TO |
+    _inotify.IN_CREATE | _inotify.IN_DELETE |
+    _inotify.IN_DELETE_SELF | _inotify.IN_MOVE_SELF
+)
+
+_libc = None
+
+
+def _libc_call(name: str, *args):
+    global _libc
+    if not _libc:
+        _libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+    res = getattr(_libc, name)(*args)
+    if res < 0:
+        err = ctypes.get_errno()
+        raise OSError(err, os.strerror(err))
+    return res
+
+
+@dataclasses.dataclass
+class InotifyEvent():
+    wd: int
+    mask: int
+    cookie: int
+    name: str
+
+    @property
+    def is_dir(self):
+        return bool(self.mask & _inotify.IN_ISDIR)
+
+
+class InotifyIO(contextlib.AbstractContextManager):
+    _frame_size = ctypes.sizeof(_inotify_event)
+    # enough for a big burst of events with long names
+    _read_size = 64 * 1024
+
+    def __init__(self, flags=_inotify.IN_CLOEXEC):
+        self._fd = _libc_call('inotify_init1', flags)
+        self._fp = open(self._fd, 'rb', buffering=False)
+
+    @property
+    def closed(self):
+        return self._fp.closed
+
+    def fileno(self):
+        return self._fd
+
+    def add_watch(self, path: str, mask: int):
+        return _libc_call('inotify_add_watch', self._fd, os.fsencode(path), ctypes.c_uint32(mask))
+
+    def rm_watch(self, wd: int):
+        try:
+            _libc_call('inotify_rm_watch', self._fd, wd)
+        except OSError as e:
+            # watch already removed by the kernel (e.g. file deleted)
+            if e.errno != errno.EINVAL:
+                raise
+
+    def read(self):
+        buf = self._fp.read(self._read_size)
+        if not buf:
+            # see LIRCDeviceIO.read
+            raise BlockingIOError()
+
+        # a generator wrapper is required to make sure that the internal read
+        # call happens right away instead of on the first yield
+        def gen():
+            offset = 0
+            while offset < len(buf):
+                ev = _inotify_event.from_buffer_copy(buf, offset)
+                offset += self._frame_size
+                name = buf[offset:offset + ev.len].rstrip(b'\0')
+                offset += ev.len
+                yield InotifyEvent(ev.wd, ev.mask, ev.cookie, os.fsdecode(name))
+        return gen()
+
+    def close(self):
+        self._fp.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __del__(self):
+        # not set if inotify_init1 failed
+        if hasattr(self, '_fp'):
+            self.close()
+
+
+class InotifyAsyncIO(InotifyIO):
+    def __init__(self, flags=_inotify.IN_CLOEXEC):
+        super().__init__(flags | _inotify.IN_NONBLOCK)
+        self._loop = asyncio.get_running_loop()
+        self._read_future = None
+
+    def _read_cb(self):
+        self._loop.remove_reader(self._fp)
+        try:
+            if not self._read_future.done():
+                self._read_future.set_result(super().read())
+        except Exception as e:
+            self._read_future.set_exception(e)
+        finally:
+            self._read_future = None
+
+    def read(self) -> asyncio.Future[typing.Generator[InotifyEvent, typing.Any, None]]:
+        if not self._read_future:
+            self._read_future = self._loop.create_future()
+            self._loop.add_reader(self._fp, self._read_cb)
+        return self._read_future
+
+    def close(self):
+        if not self._fp.closed:
+            self._loop.remove_reader(self._fp)
+        super().close()
+        if not self._read_future:
+            self._read_future = self._loop.create_future()
+        self._read_future.cancel()
+
+
+class InotifyWatch():
+    def __init__(
+        self, watcher: 'InotifyWatcher', path: str,
+        callback: typing.Callable[[str, int], typing.Any],
+        mask: int, recursive: bool, delay: float,
+    ):
+        self._watcher = watcher
+        self._path = path
+        self._callback = callback
+        self._mask = mask
+        self._recursive = recursive
+        self._delay = delay
+        # directory watched by the kernel, files are watched through their
+        # parent directory to catch atomic replaces (write tmp + rename)
+        self._kernel_path = path if recursive or os.path.isdir(path) else os.path.dirname(path)
+        # kernel watched path, '_kernel_path' or its nearest existing parent
+        # (waiting for it to be created again)
+        self._armed: str | None = None
+        # pending (coalesced) events, path -> mask
+        self._pending: dict[str, int] = {}
+        self._pending_handle = None
+
+    @property
+    def path(self):
+        return self._path
+
+    @property
+    def recursive(self):
+        return self._recursive
+
+    @property
+    def cancelled(self):
+        return self._watcher is None
+
+    def _matches(self, path: str):
+        if path == self._path:
+            return True
+        if self._recursive:
+            return path.startswith(self._path.rstrip(os.sep) + os.sep)
+        return os.path.dirname(path) == self._path
+
+    def _needs(self, kernel_path: str):
+        if kernel_path == self._armed:
+            return True
+        return self._recursive and kernel_path.startswith(self._path.rstrip(os.sep) + os.sep)
+
+    def _push(self, path: str, mask: int):
+        if not mask & (self._mask | _inotify.IN_IGNORED):
+            return
+        self._pending[path] = self._pending.get(path, 0) | mask
+        if not self._pending_handle:
+            self._pending_handle = self._watcher._call_later(self._delay, self._flush)
+
+    def _flush(self):
+        self._pending_handle = None
+        pending, self._pending = self._pending, {}
+        for path, mask in pending.items():
+            self._callback(path, mask)
+
+    def cancel(self):
+        if self._pending_handle:
+            self._pending_handle.cancel()
+            self._pending_handle = None
+        self._pending = {}
+        if self._watcher:
+            self._watcher._remove(self)
+            self._watcher = None
+
+
+class InotifyWatcher():
+    """
+    Watch files and directories for changes (using a single inotify fd).
+
+    Bursts of events on the same path are coalesced, the callbacks are called
+    once per path with the combined mask, 'delay' seconds after the first
+    event of the burst. The callbacks are scheduled with 'cb_call_later'
+    (default, the asyncio loop).
+
+    When a watched path (or its directory) is removed or replaced, the
+    callback gets the path with IN_IGNORED, the watch continues from the
+    nearest existing parent and the callback gets IN_CREATE when the path
+    is created again.
+    """
+
+    # mask used for all the kernel watches, individual watches are
+    # filtered later, this way all the watches can share the same wd
+    _kernel_mask = INOTIFY_CHANGES | _inotify.IN_EXCL_UNLINK
+
+    def __init__(
+        self, *,
+        cb_call_later: typing.Callable[[float, typing.Callable[[], typing.Any]], typing.Any] | None = None,
+    ):
+        self._loop = asyncio.get_running_loop()
+        self._cb_call_later = cb_call_later
+        self._io = InotifyAsyncIO()
+        self._wd_paths: dict[int, str] = {}
+        self._path_wds: dict[str, int] = {}
+        self._watches: list[InotifyWatch] = []
+        self._task = self._loop.create_task(self._read())
+
+    @property
+    def closed(self):
+        return self._io.closed
+
+    def _call_later(self, delay: float, callback):
+        # the handle from 'cb_call_later' (None if not available)
+        if self._cb_call_later and (handle := self._cb_call_later(delay, callback)):
+            return handle
+        return self._loop.call_later(delay, callback)
+
+    def _add_kernel_watch(self, path: str):
+        if path in self._path_wds:
+            return True
+        try:
+            wd = self._io.add_watch(path, self._kernel_mask)
+        except (FileNotFoundError, NotADirectoryError, PermissionError):
+            return False
+        # same directory under a new path (renamed)
+        self._path_wds.pop(self._wd_paths.get(wd), None)
+        self._wd_paths[wd] = path
+        self._path_wds[path] = wd
+        return True
+
+    def _add_kernel_watch_tree(self, path: str):
+        self._add_kernel_watch(path)
+        if os.path.isdir(path):
+            for root, dirs, _ in os.walk(path):
+                for d in dirs:
+                    self._add_kernel_watch(os.path.join(root, d))
+
+    def _arm(self, watch: InotifyWatch):
+        # kernel watch on the watched directory, or on the nearest existing
+        # parent until the directory exists (again)
+        path = watch._kernel_path
+        while not self._add_kernel_watch(path) and os.path.dirname(path) != path:
+            path = os.path.dirname(path)
+        watch._armed = path
+        if path == watch._kernel_path:
+            if watch._recursive:
+                self._add_kernel_watch_tree(path)
+            return True
+        return False
+
+    def _rearm(self, watch: InotifyWatch):
+        if self._arm(watch) and os.path.lexists(watch._path):
+            watch._push(watch._path, _inotify.IN_CREATE)
+        self._prune()
+
+    def _lost(self, path: str):
+        # kernel watches on 'path' and below are gone or stale, the watches
+        # on 'path' watch again from the parent
+        prefix = path.rstrip(os.sep) + os.sep
+        for p, wd in list(self._path_wds.items()):
+            if p == path or p.startswith(prefix):
+                del self._path_wds[p]
+                del self._wd_paths[wd]
+                self._io.rm_watch(wd)
+        for w in list(self._watches):
+            if w._armed == path:
+                w._push(w._path, _inotify.IN_IGNORED)
+                self._rearm(w)
+
+    def _remove(self, watch: InotifyWatch):
+        self._watches.remove(watch)
+        self._prune()
+
+    def _prune(self):
+        # remove kernel watches that are no longer needed
+        for path, wd in list(self._path_wds.items()):
+            if not any(map(lambda w: w._needs(path), self._watches)):
+                del self._path_wds[path]
+                del self._wd_paths[wd]
+                if not self._io.closed:
+                    self._io.rm_watch(wd)
+
+    def _dispatch(self, ev: InotifyEvent):
+        if ev.mask & _inotify.IN_Q_OVERFLOW:
+            # events were lost, report every watched root as changed
+            for w in self._watches:
+                w._push(w._path, ev.mask)
+            return
+
+        if ev.wd not in self._wd_paths:
+            return
+        wd_path = self._wd_paths[ev.wd]
+
+        if ev.mask & _inotify.IN_IGNORED:
+            # kernel watch removed (deleted, unmounted)
+            self._lost(wd_path)
+            return
+
+        if ev.mask & _inotify.IN_MOVE_SELF and any(map(lambda w: w._armed == wd_path, self._watches)):
+            # the path no longer refers to the watched directory
+            self._lost(wd_path)
+
+        path = os.path.join(wd_path, ev.name) if ev.name else wd_path
+
+        # created (again) on the way to a watched directory
+        if ev.mask & (_inotify.IN_CREATE | _inotify.IN_MOVED_TO):
+            for w in list(self._watches):
+                if w._armed == wd_path != w._kernel_path and (w._kernel_path + os.sep).startswith(path + os.sep):
+                    self._rearm(w)
+
+        # new directory inside a recursive watch
+        if ev.is_dir and ev.mask & (_inotify.IN_CREATE | _inotify.IN_MOVED_TO):
+            if any(map(lambda w: w._recursive and w._matches(path), self._watches)):
+                self._add_kernel_watch_tree(path)
+
+        for w in list(self._watches):
+            if w._matches(path):
+                w._push(path, ev.mask)
+
+    async def _read(self):
+        with contextlib.suppress(asyncio.CancelledError):
+            while evs := await self._io.read():
+                for ev in evs:
+                    self._dispatch(ev)
+
+    def watch(
+        self, path: str, callback: typing.Callable[[str, int], typing.Any], *,
+        mask: int = INOTIFY_CHANGES,
+        recursive=False,
+        delay: float = 0.1,
+    ):
+        """
+        Watch a file or directory, 'callback(path, mask)' is called for each
+        changed path (coalesced). Returns a handle, call 'cancel' to stop.
+        """
+        if self._io.closed:
+            raise RuntimeError("Watcher is closed")
+        path = os.path.abspath(path)
+        watch = InotifyWatch(self, path, callback, mask, recursive, delay)
+        self._watches.append(watch)
+        self._arm(watch)
+        return watch
+
+    def close(self):
+        for w in list(self._watches):
+            w.cancel()
+        self._io.close()
+        self._task.cancel()
+
+
+def inotify_mask_names(mask: int):
+    for name, value in vars(_inotify).items():
+        if name.startswith('IN_') and name not in ('IN_CLOEXEC', 'IN_NONBLOCK') and mask & value:
+            yield name
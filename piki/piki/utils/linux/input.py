@@ -1,7 +1,9 @@
 import ctypes
 import dataclasses
+import errno
 import fcntl
 import struct
+import sys
 import typing
 
 import ioctl_opt
@@ -14,8 +16,23 @@ from .sysfs import *
 # https://github.com/torvalds/linux/blob/master/drivers/input/evdev.c
 
 
+class _input_keymap_entry(ctypes.Structure):
+    FLAG_BY_INDEX = 1
+
+    _fields_ = [
+        ('flags', ctypes.c_uint8),
+        ('len', ctypes.c_uint8),
+        ('index', ctypes.c_uint16),
+        ('keycode', ctypes.c_uint32),
+        ('scancode', ctypes.c_uint8 * 32),
+    ]
+
+
 class _input():
+    EVIOCGKEYCODE_V2 = ioctl_opt.IOR(ord('E'), 0x04, _input_keymap_entry)
+    EVIOCSKEYCODE_V2 = ioctl_opt.IOW(ord('E'), 0x04, _input_keymap_entry)
     EVIOCSCLOCKID = ioctl_opt.IOW(ord('E'), 0xa0, ctypes.c_uint32)
+    KEY_RESERVED = 0
 
 
 @dataclasses.dataclass(eq=False)
@@ -32,6 +49,34 @@ class InputDevice(ClassDevice, children=[EventDevice]):
     event0: EventDevice | None
 
 
+# capabilities exported as bitmasks in the input device uevent, hex words
+# of 'unsigned long' (most significant first), see input_add_uevent_bm_var
+_input_capabilities = ('EV', 'KEY', 'REL', 'ABS', 'MSC', 'LED', 'SND', 'FF', 'SW')
+
+
+def input_parse_bitmask(value: str):
+    bits = ctypes.sizeof(ctypes.c_ulong) * 8
+    for i, word in enumerate(reversed(value.split())):
+        w = int(word, 16)
+        while w:
+            low = w & -w
+            yield i * bits + low.bit_length() - 1
+            w ^= low
+
+
+def input_device_capabilities(dev: InputDevice):
+    """
+    Capabilities from the uevent bitmasks (no need to open the device),
+    returns a dict with the bitmask name (EV, KEY, REL...) and the codes.
+    """
+    result: dict[str, list[int]] = {}
+    for name in _input_capabilities:
+        value = dev.uevent_var(name, '0')
+        if value != '0':
+            result[name] = list(input_parse_bitmask(value))
+    return result
+
+
 def event_find_devices():
     return sysfs_find_class_devices(EventDevice)
 
@@ -43,5 +88,53 @@ def event_device_ioctl_set_clock_id(fd: int, clock: typing.Literal['realtime', '
     fcntl.ioctl(fd, _input.EVIOCSCLOCKID, buf)
 
 
+def event_device_ioctl_get_keycode(fd: int, index: int):
+    # get keymap entry by index, returns None after the last entry
+    ke = _input_keymap_entry(flags=_input_keymap_entry.FLAG_BY_INDEX, index=index)
+    try:
+        fcntl.ioctl(fd, _input.EVIOCGKEYCODE_V2, ke)
+    except OSError as e:
+        if e.errno == errno.EINVAL:
+            return None
+        raise
+    scancode = int.from_bytes(bytes(ke.scancode[:ke.len]), sys.byteorder)
+    return scancode, ke.keycode
+
+
+def event_device_ioctl_set_keycode(fd: int, scancode: int, keycode: int):
+    # set keymap entry by scancode, KEY_RESERVED removes the entry
+    # the kernel rc keymaps only support up to 32-bit scancodes
+    ke = _input_keymap_entry(len=4, keycode=keycode)
+    ke.scancode[:4] = scancode.to_bytes(4, sys.byteorder)
+    fcntl.ioctl(fd, _input.EVIOCSKEYCODE_V2, ke)
+
+
+def event_device_get_keymap(fd: int):
+    index = 0
+    while entry := event_device_ioctl_get_keycode(fd, index):
+        yield entry
+        index += 1
+
+
+def event_device_set_keymap(fd: int, keymap: dict[int, int]):
+    """
+    Replace the device keymap (scancode -> keycode) in a single pass, stale
+    entries are removed and only the changed entries are written.
+
+    Returns the number of entries set and removed.
+    """
+    current = dict(event_device_get_keymap(fd))
+    removed = 0
+    for scancode in current.keys() - keymap.keys():
+        event_device_ioctl_set_keycode(fd, scancode, _input.KEY_RESERVED)
+        removed += 1
+    changed = 0
+    for scancode, keycode in keymap.items():
+        if current.get(scancode) != keycode:
+            event_device_ioctl_set_keycode(fd, scancode, keycode)
+            changed += 1
+    return changed, removed
+
+
 def input_find_devices():
     return sysfs_find_class_devices(InputDevice)
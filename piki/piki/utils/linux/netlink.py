@@ -0,0 +1,484 @@
+import asyncio
+import contextlib
+import ctypes
+import dataclasses
+import errno
+import os
+import socket
+import sys
+import typing
+
+# https://github.com/torvalds/linux/blob/master/include/uapi/linux/netlink.h
+# https://github.com/torvalds/linux/blob/master/include/uapi/linux/rtnetlink.h
+# https://github.com/torvalds/linux/blob/master/include/uapi/linux/if_link.h
+# https://github.com/torvalds/linux/blob/master/include/uapi/linux/if_addr.h
+# https://man7.org/linux/man-pages/man7/rtnetlink.7.html
+
+
+class _netlink():
+    NLMSG_NOOP = 1
+    NLMSG_ERROR = 2
+    NLMSG_DONE = 3
+    NLMSG_OVERRUN = 4
+    NLM_F_REQUEST = 0x01
+    NLM_F_MULTI = 0x02
+    NLM_F_DUMP = 0x300
+    RTM_NEWLINK = 16
+    RTM_DELLINK = 17
+    RTM_GETLINK = 18
+    RTM_NEWADDR = 20
+    RTM_DELADDR = 21
+    RTM_GETADDR = 22
+    RTM_NEWROUTE = 24
+    RTM_DELROUTE = 25
+    RTM_GETROUTE = 26
+    RTMGRP_LINK = 0x1
+    RTMGRP_IPV4_IFADDR = 0x10
+    RTMGRP_IPV4_ROUTE = 0x40
+    RTMGRP_IPV6_IFADDR = 0x100
+    RTMGRP_IPV6_ROUTE = 0x400
+    IFLA_ADDRESS = 1
+    IFLA_IFNAME = 3
+    IFLA_MTU = 4
+    IFLA_OPERSTATE = 16
+    IFA_ADDRESS = 1
+    IFA_LOCAL = 2
+    IFA_LABEL = 3
+    RTA_DST = 1
+    RTA_OIF = 4
+    RTA_GATEWAY = 5
+    RTA_PRIORITY = 6
+    RTA_TABLE = 15
+
+
+class _nlmsghdr(ctypes.Structure):
+    _fields_ = [
+        ('nlmsg_len', ctypes.c_uint32),
+        ('nlmsg_type', ctypes.c_uint16),
+        ('nlmsg_flags', ctypes.c_uint16),
+        ('nlmsg_seq', ctypes.c_uint32),
+        ('nlmsg_pid', ctypes.c_uint32),
+    ]
+
+
+class _ifinfomsg(ctypes.Structure):
+    _fields_ = [
+        ('ifi_family', ctypes.c_uint8),
+        ('__ifi_pad', ctypes.c_uint8),
+        ('ifi_type', ctypes.c_uint16),
+        ('ifi_index', ctypes.c_int32),
+        ('ifi_flags', ctypes.c_uint32),
+        ('ifi_change', ctypes.c_uint32),
+    ]
+
+
+class _ifaddrmsg(ctypes.Structure):
+    _fields_ = [
+        ('ifa_family', ctypes.c_uint8),
+        ('ifa_prefixlen', ctypes.c_uint8),
+        ('ifa_flags', ctypes.c_uint8),
+        ('ifa_scope', ctypes.c_uint8),
+        ('ifa_index', ctypes.c_uint32),
+    ]
+
+
+class _rtmsg(ctypes.Structure):
+    _fields_ = [
+        ('rtm_family', ctypes.c_uint8),
+        ('rtm_dst_len', ctypes.c_uint8),
+        ('rtm_src_len', ctypes.c_uint8),
+        ('rtm_tos', ctypes.c_uint8),
+        ('rtm_table', ctypes.c_uint8),
+        ('rtm_protocol', ctypes.c_uint8),
+        ('rtm_scope', ctypes.c_uint8),
+        ('rtm_type', ctypes.c_uint8),
+        ('rtm_flags', ctypes.c_uint32),
+    ]
+
+
+class _rtattr(ctypes.Structure):
+    _fields_ = [
+        ('rta_len', ctypes.c_uint16),
+        ('rta_type', ctypes.c_uint16),
+    ]
+
+
+# https://github.com/torvalds/linux/blob/master/include/uapi/linux/if.h
+# https://github.com/torvalds/linux/blob/master/include/uapi/linux/rtnetlink.h
+IFF_UP = 0x1
+IFF_LOOPBACK = 0x8
+IFF_RUNNING = 0x40
+RT_SCOPE_UNIVERSE = 0
+RT_SCOPE_LINK = 253
+RT_SCOPE_HOST = 254
+_operstates = ['unknown', 'notpresent', 'down', 'lowerlayerdown',
+               'testing', 'dormant', 'up']
+
+
+def _align(n: int):
+    return (n + 3) & ~3
+
+
+def _parse_attrs(buf: bytes, offset: int, end: int):
+    while offset + ctypes.sizeof(_rtattr) <= end:
+        rta = _rtattr.from_buffer_copy(buf, offset)
+        if rta.rta_len < ctypes.sizeof(_rtattr):
+            break
+        yield rta.rta_type, buf[offset + ctypes.sizeof(_rtattr):offset + rta.rta_len]
+        offset += _align(rta.rta_len)
+
+
+def _ip(family: int, data: bytes | None):
+    return socket.inet_ntop(family, data) if data else None
+
+
+@dataclasses.dataclass(frozen=True)
+class NetLink():
+    index: int
+    name: str
+    flags: int
+    mtu: int | None
+    address: str | None
+    operstate: str
+
+    @property
+    def is_up(self):
+        return bool(self.flags & IFF_UP)
+
+    @property
+    def is_running(self):
+        return bool(self.flags & IFF_RUNNING)
+
+    @property
+    def is_loopback(self):
+        return bool(self.flags & IFF_LOOPBACK)
+
+    @property
+    def key(self):
+        return self.index
+
+
+@dataclasses.dataclass(frozen=True)
+class NetAddress():
+    index: int
+    family: int
+    prefixlen: int
+    scope: int
+    address: str
+    label: str | None
+
+    @property
+    def key(self):
+        return self.index, self.family, self.address, self.prefixlen
+
+
+@dataclasses.dataclass(frozen=True)
+class NetRoute():
+    family: int
+    table: int
+    dst: str | None
+    dst_len: int
+    gateway: str | None
+    oif: int | None
+    priority: int | None
+    scope: int
+
+    @property
+    def is_default(self):
+        return self.dst_len == 0
+
+    @property
+    def key(self):
+        return self.family, self.table, self.dst, self.dst_len, self.priority, self.oif
+
+
+@dataclasses.dataclass(frozen=True)
+class NetChange():
+    action: typing.Literal['new', 'del']
+    item: NetLink | NetAddress | NetRoute
+
+
+def _parse_link(buf: bytes, offset: int, end: int):
+    ifi = _ifinfomsg.from_buffer_copy(buf, offset)
+    attrs = dict(_parse_attrs(buf, offset + ctypes.sizeof(_ifinfomsg), end))
+    name = attrs.get(_netlink.IFLA_IFNAME, b'').rstrip(b'\0').decode()
+    mtu = attrs.get(_netlink.IFLA_MTU)
+    mac = attrs.get(_netlink.IFLA_ADDRESS)
+    operstate = attrs.get(_netlink.IFLA_OPERSTATE, b'\0')[0]
+    return NetLink(
+        ifi.ifi_index, name, ifi.ifi_flags,
+        int.from_bytes(mtu, sys.byteorder) if mtu else None,
+        ':'.join('%02x' % b for b in mac) if mac else None,
+        _operstates[operstate] if operstate < len(_operstates) else 'unknown',
+    )
+
+
+def _parse_addr(buf: bytes, offset: int, end: int):
+    ifa = _ifaddrmsg.from_buffer_copy(buf, offset)
+    attrs = dict(_parse_attrs(buf, offset + ctypes.sizeof(_ifaddrmsg), end))
+    # IFA_LOCAL is the interface address on point-to-point links
+    # IFA_ADDRESS is the peer address, on other links they are the same
+    addr = attrs.get(_netlink.IFA_LOCAL) or attrs.get(_netlink.IFA_ADDRESS)
+    label = attrs.get(_netlink.IFA_LABEL)
+    return NetAddress(
+        ifa.ifa_index, ifa.ifa_family, ifa.ifa_prefixlen, ifa.ifa_scope,
+        _ip(ifa.ifa_family, addr),
+        label.rstrip(b'\0').decode() if label else None,
+    )
+
+
+def _parse_route(buf: bytes, offset: int, end: int):
+    rtm = _rtmsg.from_buffer_copy(buf, offset)
+    attrs = dict(_parse_attrs(buf, offset + ctypes.sizeof(_rtmsg), end))
+    table = attrs.get(_netlink.RTA_TABLE)
+    oif = attrs.get(_netlink.RTA_OIF)
+    priority = attrs.get(_netlink.RTA_PRIORITY)
+    return NetRoute(
+        rtm.rtm_family,
+        int.from_bytes(table, sys.byteorder) if table else rtm.rtm_table,
+        _ip(rtm.rtm_family, attrs.get(_netlink.RTA_DST)), rtm.rtm_dst_len,
+        _ip(rtm.rtm_family, attrs.get(_netlink.RTA_GATEWAY)),
+        int.from_bytes(oif, sys.byteorder) if oif else None,
+        int.from_bytes(priority, sys.byteorder) if priority else None,
+        rtm.rtm_scope,
+    )
+
+
+# family header of the dump requests, AF_UNSPEC (zeroed header) requests
+# all families
+_dump_headers = {
+    _netlink.RTM_GETLINK: _ifinfomsg,
+    _netlink.RTM_GETADDR: _ifaddrmsg,
+    _netlink.RTM_GETROUTE: _rtmsg,
+}
+
+_parsers = {
+    _netlink.RTM_NEWLINK: ('new', _parse_link),
+    _netlink.RTM_DELLINK: ('del', _parse_link),
+    _netlink.RTM_NEWADDR: ('new', _parse_addr),
+    _netlink.RTM_DELADDR: ('del', _parse_addr),
+    _netlink.RTM_NEWROUTE: ('new', _parse_route),
+    _netlink.RTM_DELROUTE: ('del', _parse_route),
+}
+
+
+class RTNetlinkIO(contextlib.AbstractContextManager):
+    _read_size = 64 * 1024
+    _groups_all = (
+        _netlink.RTMGRP_LINK |
+        _netlink.RTMGRP_IPV4_IFADDR | _netlink.RTMGRP_IPV6_IFADDR |
+        _netlink.RTMGRP_IPV4_ROUTE | _netlink.RTMGRP_IPV6_ROUTE
+    )
+
+    def __init__(self, groups=0):
+        self._sock = socket.socket(
+            socket.AF_NETLINK, socket.SOCK_RAW | socket.SOCK_CLOEXEC,
+            socket.NETLINK_ROUTE,
+        )
+        self._sock.bind((0, groups))
+        self._seq = 0
+
+    @property
+    def closed(self):
+        return self._sock.fileno() < 0
+
+    def fileno(self):
+        return self._sock.fileno()
+
+    def send_dump_request(self, msg_type: int):
+        self._seq += 1
+        body = _dump_headers[msg_type]()
+        hdr = _nlmsghdr(
+            ctypes.sizeof(_nlmsghdr) + ctypes.sizeof(body), msg_type,
+            _netlink.NLM_F_REQUEST | _netlink.NLM_F_DUMP, self._seq, 0,
+        )
+        self._sock.send(bytes(hdr) + bytes(body))
+
+    def read(self):
+        buf = self._sock.recv(self._read_size)
+        if not buf:
+            # see LIRCDeviceIO.read
+            raise BlockingIOError()
+
+        # a generator wrapper is required to make sure that the internal read
+        # call happens right away instead of on the first yield
+        def gen():
+            offset = 0
+            while offset + ctypes.sizeof(_nlmsghdr) <= len(buf):
+                hdr = _nlmsghdr.from_buffer_copy(buf, offset)
+                end = offset + hdr.nlmsg_len
+                if hdr.nlmsg_len < ctypes.sizeof(_nlmsghdr) or end > len(buf):
+                    break
+                body = offset + ctypes.sizeof(_nlmsghdr)
+                if hdr.nlmsg_type == _netlink.NLMSG_DONE:
+                    yield None
+                elif hdr.nlmsg_type == _netlink.NLMSG_ERROR:
+                    err = -ctypes.c_int32.from_buffer_copy(buf, body).value
+                    if err:
+                        raise OSError(err, os.strerror(err))
+                elif hdr.nlmsg_type in _parsers:
+                    action, parse = _parsers[hdr.nlmsg_type]
+                    yield NetChange(action, parse(buf, body, end))
+                offset += _align(hdr.nlmsg_len)
+        return gen()
+
+    def dump(self):
+        # kernel only runs one dump at a time per socket, the requests are
+        # sent back-to-back, each after the previous reply is done
+        for msg_type in (_netlink.RTM_GETLINK, _netlink.RTM_GETADDR, _netlink.RTM_GETROUTE):
+            self.send_dump_request(msg_type)
+            done = False
+            while not done:
+                for change in self.read():
+                    if change is None:
+                        done = True
+                    else:
+                        yield change
+
+    def close(self):
+        self._sock.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __del__(self):
+        self.close()
+
+
+class RTNetlinkAsyncIO(RTNetlinkIO):
+    def __init__(self, groups=0):
+        super().__init__(groups)
+        self._loop = asyncio.get_running_loop()
+        self._read_future = None
+        self._sock.setblocking(False)
+
+    def _read_cb(self):
+        self._loop.remove_reader(self._sock)
+        try:
+            if not self._read_future.done():
+                self._read_future.set_result(super().read())
+        except Exception as e:
+            self._read_future.set_exception(e)
+        finally:
+            self._read_future = None
+
+    def read(self) -> asyncio.Future[typing.Generator[NetChange | None, typing.Any, None]]:
+        if not self._read_future:
+            self._read_future = self._loop.create_future()
+            self._loop.add_reader(self._sock, self._read_cb)
+        return self._read_future
+
+    async def dump(self):
+        res = []
+        for msg_type in (_netlink.RTM_GETLINK, _netlink.RTM_GETADDR, _netlink.RTM_GETROUTE):
+            self.send_dump_request(msg_type)
+            done = False
+            while not done:
+                for change in await self.read():
+                    if change is None:
+                        done = True
+                    else:
+                        res.append(change)
+        return res
+
+    def close(self):
+        if not self.closed:
+            self._loop.remove_reader(self._sock)
+        super().close()
+        if not self._read_future:
+            self._read_future = self._loop.create_future()
+        self._read_future.cancel()
+
+
+class NetworkState():
+    def __init__(self):
+        self.links: dict[typing.Any, NetLink] = {}
+        self.addresses: dict[typing.Any, NetAddress] = {}
+        self.routes: dict[typing.Any, NetRoute] = {}
+
+    def apply(self, change: NetChange):
+        if isinstance(change.item, NetLink):
+            d = self.links
+        elif isinstance(change.item, NetAddress):
+            d = self.addresses
+        else:
+            d = self.routes
+        if change.action == 'new':
+            d[change.item.key] = change.item
+        else:
+            d.pop(change.item.key, None)
+
+    def changes_to(self, other: 'NetworkState'):
+        """ Changes that turn this state into 'other'. """
+        res: list[NetChange] = []
+        for d, d_other in (
+            (self.links, other.links),
+            (self.addresses, other.addresses),
+            (self.routes, other.routes),
+        ):
+            res.extend(NetChange('del', item) for key, item in d.items() if key not in d_other)
+            res.extend(NetChange('new', item) for key, item in d_other.items() if d.get(key) != item)
+        return res
+
+    def link_name(self, index: int):
+        link = self.links.get(index)
+        return link.name if link else str(index)
+
+    def global_addresses(self):
+        """ Addresses with global scope (similar to 'hostname -I'). """
+        for addr in self.addresses.values():
+            if addr.scope == RT_SCOPE_UNIVERSE:
+                yield addr
+
+    def default_routes(self):
+        for route in self.routes.values():
+            if route.is_default and route.gateway:
+                yield route
+
+
+def netlink_dump_state():
+    """ Get the current network state (blocking, but fast). """
+    state = NetworkState()
+    with RTNetlinkIO() as io:
+        for change in io.dump():
+            state.apply(change)
+    return state
+
+
+async def netlink_monitor(cb_change: typing.Callable[[NetworkState, NetChange], typing.Any], *, state: NetworkState | None = None, cb_start=None):
+    """
+    Dump the current network state and then stream change notifications.
+    'cb_change' is called for each change (already applied to 'state').
+
+    When notifications are lost (ENOBUFS, the socket buffer overran), the
+    state is dumped again and the differences are reported as changes.
+    """
+    state = state or NetworkState()
+    # subscribe before dumping, changes that happen during the dump are
+    # queued on the socket and applied after
+    with RTNetlinkAsyncIO(RTNetlinkIO._groups_all) as io:
+        for change in await io.dump():
+            state.apply(change)
+        if cb_start:
+            cb_start(state)
+        with contextlib.suppress(asyncio.CancelledError):
+            while True:
+                try:
+                    changes = await io.read()
+                except OSError as e:
+                    if e.errno != errno.ENOBUFS:
+                        raise
+                    # dump on a new socket (the monitor socket may still
+                    # be running a dump), notifications keep being queued
+                    fresh = NetworkState()
+                    with RTNetlinkAsyncIO() as io_dump:
+                        for change in await io_dump.dump():
+                            fresh.apply(change)
+                    changes = state.changes_to(fresh)
+                for change in changes:
+                    if change:
+                        state.apply(change)
+                        cb_change(state, change)
@@ -3,6 +3,23 @@ import os
 import typing
 import weakref
 
+# the sysfs and dev roots can be changed to use a synthetic device tree
+# (see sysfs_fake), e.g. to benchmark device discovery without hardware
+_sysfs_root = os.environ.get('PIKI_SYSFS_ROOT', '/sys')
+_dev_root = os.environ.get('PIKI_DEV_ROOT', '/dev')
+
+
+def sysfs_set_root(sys_root: str | None = None, dev_root: str | None = None):
+    global _sysfs_root, _dev_root
+    if sys_root is not None:
+        _sysfs_root = sys_root
+    if dev_root is not None:
+        _dev_root = dev_root
+
+
+def sysfs_get_root():
+    return _sysfs_root, _dev_root
+
 
 @dataclasses.dataclass(eq=False)
 class ClassDevice():
@@ -58,7 +75,7 @@ class ClassDevice():
     @property
     def dev_path(self):
         devname = self.uevent_var('DEVNAME')
-        return '/dev/' + devname if devname else None
+        return os.path.join(_dev_root, devname) if devname else None
 
 
 _ClassDevice_TV = typing.TypeVar('ClassDevice', bound=ClassDevice)
@@ -79,4 +96,4 @@ def sysfs_scandir(path: str, name: str):
 
 
 def sysfs_find_class_devices(cls: type[_ClassDevice_TV], path: str | None = None):
-    return map(cls, sysfs_scandir(path or '/sys/class/' + cls._class_name, cls._device_name))
+    return map(cls, sysfs_scandir(path or os.path.join(_sysfs_root, 'class', cls._class_name), cls._device_name))
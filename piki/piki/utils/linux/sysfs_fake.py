@@ -0,0 +1,116 @@
+import os
+
+# a synthetic sysfs/dev tree generator, mimics the layout of the real
+# class devices (rc, lirc, input, event) so that device discovery can be
+# tested, benchmarked and profiled on any machine (see sysfs_set_root)
+
+
+def _write(path: str, content: str):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as fp:
+        fp.write(content)
+
+
+def _write_uevent(path: str, **kwargs):
+    _write(os.path.join(path, 'uevent'), ''.join(
+        '%s=%s\n' % (k, v) for k, v in kwargs.items()
+    ))
+
+
+def _link_class(sys_root: str, class_name: str, path: str):
+    class_dir = os.path.join(sys_root, 'class', class_name)
+    os.makedirs(class_dir, exist_ok=True)
+    os.symlink(
+        os.path.relpath(path, class_dir),
+        os.path.join(class_dir, os.path.basename(path)),
+    )
+
+
+class _FakeTree():
+    def __init__(self, root: str):
+        self.sys_root = os.path.join(root, 'sys')
+        self.dev_root = os.path.join(root, 'dev')
+        self.devices = os.path.join(self.sys_root, 'devices', 'virtual')
+        self.n_input = 0
+        self.n_event = 0
+        self.n_lirc = 0
+
+    def _dev_node(self, devname: str):
+        # regular file, creating real device nodes requires root
+        _write(os.path.join(self.dev_root, devname), '')
+
+    def make_event(self, input_path: str):
+        n = self.n_event
+        self.n_event += 1
+        path = os.path.join(input_path, 'event%d' % n)
+        _write_uevent(
+            path, MAJOR=13, MINOR=64 + n, DEVNAME='input/event%d' % n,
+        )
+        _link_class(self.sys_root, 'input', path)
+        self._dev_node('input/event%d' % n)
+        return path
+
+    def make_input(self, parent: str, name: str, *, key=True):
+        n = self.n_input
+        self.n_input += 1
+        path = os.path.join(parent, 'input%d' % n)
+        _write_uevent(
+            path,
+            PRODUCT='3/1d6b/%x/110' % n,
+            NAME='"%s"' % name,
+            PHYS='"usb-0000:01:00.0-1.%d/input0"' % n,
+            PROP=0,
+            EV='120013' if key else '5',
+            KEY='e080ffdf01cfffff fffffffffffffffe' if key else '0',
+            MSC=10,
+            MODALIAS='input:b0003v1D6Bp%04Xe0110' % n,
+        )
+        _link_class(self.sys_root, 'input', path)
+        self.make_event(path)
+        return path
+
+    def make_lirc(self, rc_path: str):
+        n = self.n_lirc
+        self.n_lirc += 1
+        path = os.path.join(rc_path, 'lirc%d' % n)
+        _write_uevent(path, MAJOR=251, MINOR=n, DEVNAME='lirc%d' % n)
+        _link_class(self.sys_root, 'lirc', path)
+        self._dev_node('lirc%d' % n)
+        return path
+
+    def make_rc(self, n: int):
+        path = os.path.join(self.devices, 'rc', 'rc%d' % n)
+        _write_uevent(
+            path, NAME='rc-empty', DRV_NAME='gpio_ir_recv',
+            DEV_NAME='gpio_ir_recv',
+        )
+        _write(
+            os.path.join(path, 'protocols'),
+            '[lirc] rc-5 rc-5-sz jvc sony [nec] sanyo mce_kbd rc-6 sharp xmp imon rc-mm\n',
+        )
+        _link_class(self.sys_root, 'rc', path)
+        self.make_lirc(path)
+        self.make_input(path, 'gpio_ir_recv')
+        return path
+
+
+def sysfs_fake_make_tree(root: str, *, rc=1, input=0):
+    """
+    Create a synthetic device tree at 'root', with 'rc' rc devices (each
+    with a lirc and input/event device) and 'input' extra input devices
+    (USB HID like, with KEY capabilities).
+
+    Returns the sysfs and dev roots, to be used with sysfs_set_root.
+    """
+    tree = _FakeTree(root)
+    for n in range(rc):
+        tree.make_rc(n)
+    for n in range(input):
+        tree.make_input(
+            os.path.join(tree.devices, 'usb', 'hid%d' % n),
+            'USB HID Keyboard %d' % n,
+        )
+    for class_name in ('rc', 'lirc', 'input'):
+        os.makedirs(os.path.join(tree.sys_root, 'class', class_name), exist_ok=True)
+    os.makedirs(tree.dev_root, exist_ok=True)
+    return tree.sys_root, tree.dev_root
@@ -1,9 +1,17 @@
+import asyncio
+import bisect
+import collections
+import inspect
 import logging
 import os
+import time
 import typing
+import weakref
 
 import urwid
 
+logger = logging.getLogger(__name__)
+
 _ss_default_attrs = {
     'button': ['label'],
     'boxbutton': ['label', 'title'],
@@ -131,6 +139,353 @@ def make_list_buttons(spec, on_click=None, wrap_around=False):
     ))
 
 
+class HeadlessScreen(urwid.display.BaseScreen):
+    """
+    Screen without a terminal (fixed size, no input), the canvas content is
+    still walked and converted to text, like a real screen would do, so it
+    can be used to measure the full frame cost (benchmarks).
+    """
+
+    def __init__(self, size: tuple[int, int] = (80, 24)):
+        super().__init__()
+        self._size = size
+        self.frames = 0
+        self.lines: list[str] = []
+        self.canvas = None
+
+    def get_cols_rows(self):
+        return self._size
+
+    def set_size(self, size: tuple[int, int]):
+        self._size = size
+
+    def draw_screen(self, size, canvas):
+        lines = []
+        for row in canvas.content():
+            line = []
+            for a, cs, run in row:
+                # resolve the attribute, as the real screen does
+                self._palette.get(a)
+                line.append(run)
+            lines.append(b''.join(line).decode('utf-8', 'replace'))
+        self.lines = lines
+        self.frames += 1
+        # keep the canvas, like the real screen, the canvas cache only holds
+        # weak references (otherwise nothing is ever cached)
+        self.canvas = canvas
+
+    def hook_event_loop(self, event_loop, callback):
+        pass
+
+    def unhook_event_loop(self, event_loop):
+        pass
+
+    def get_input(self, raw_keys=False):
+        return ([], []) if raw_keys else []
+
+
+class VirtualListWalker(urwid.ListWalker):
+    """
+    List walker for big lists, the rows (widgets) are only created when
+    requested by the ListBox (i.e. the visible rows), using
+    'cb_create_widget(position)', and kept on a small LRU cache.
+    """
+
+    def __init__(
+        self, size: int, cb_create_widget: typing.Callable[[int], urwid.Widget], *,
+        cache_size=128, wrap_around=False,
+    ):
+        self._size = size
+        self._cb_create_widget = cb_create_widget
+        self._cache: collections.OrderedDict[int, urwid.Widget] = collections.OrderedDict()
+        self._cache_size = cache_size
+        self._wrap_around = wrap_around
+        self._focus = 0
+
+    def __len__(self):
+        return self._size
+
+    def __getitem__(self, position: int):
+        if not isinstance(position, int) or not 0 <= position < self._size:
+            raise IndexError(position)
+        if position in self._cache:
+            self._cache.move_to_end(position)
+            return self._cache[position]
+        w = self._cb_create_widget(position)
+        self._cache[position] = w
+        if len(self._cache) > self._cache_size:
+            self._cache.popitem(last=False)
+        return w
+
+    def cached(self, position: int):
+        """ Get the row widget only if it exists (e.g. to update in place). """
+        return self._cache.get(position)
+
+    def set_size(self, size: int):
+        self._size = size
+        for position in [p for p in self._cache if p >= size]:
+            del self._cache[position]
+        if self._focus >= size:
+            self._focus = max(0, size - 1)
+        self._modified()
+
+    def invalidate(self, position: int | None = None):
+        """ Drop the cached row(s), they are recreated when needed. """
+        if position is None:
+            self._cache.clear()
+        else:
+            self._cache.pop(position, None)
+        self._modified()
+
+    def next_position(self, position: int):
+        if position + 1 < self._size:
+            return position + 1
+        if self._wrap_around and self._size:
+            return 0
+        raise IndexError(position)
+
+    def prev_position(self, position: int):
+        if position > 0:
+            return position - 1
+        if self._wrap_around and self._size:
+            return self._size - 1
+        raise IndexError(position)
+
+    def positions(self, reverse=False):
+        return range(self._size - 1, -1, -1) if reverse else range(self._size)
+
+    def set_focus(self, position: int):
+        if not 0 <= position < self._size:
+            raise IndexError(position)
+        self._focus = position
+        self._modified()
+
+    @property
+    def focus(self):
+        return self._focus if self._size else None
+
+    @focus.setter
+    def focus(self, position):
+        self.set_focus(position)
+
+
+class VirtualListBox(urwid.ListBox):
+    """
+    ListBox for VirtualListWalker, the scroll position (used by ScrollBar)
+    comes from the walker position instead of walking all the rows.
+    """
+
+    def get_first_visible_pos(self, size, focus=False):
+        if not self._body:
+            return 0
+        _mid, top, _bottom = self.calculate_visible(size, focus)
+        if top.fill:
+            return top.fill[-1].position
+        return self.focus_position
+
+
+class CachedWidget(urwid.WidgetWrap):
+    """
+    Keeps the rendered canvases (per size and focus) of a static widget,
+    urwid's canvas cache only holds weak references, canvases are lost when
+    the widget is not drawn (e.g. hidden window). The kept canvases are
+    detached copies, they keep nothing alive (urwid's cache keeps strong
+    references to the widgets of live canvases). Input (keypress, mouse)
+    invalidates the cache, other changes to the wrapped widget require an
+    explicit 'invalidate'.
+    """
+
+    def __init__(self, w: urwid.Widget, *, cache_size=4):
+        super().__init__(w)
+        self._canvases: collections.OrderedDict[tuple, urwid.Canvas] = collections.OrderedDict()
+        self._cache_size = cache_size
+
+    @staticmethod
+    def _copy(canvas: urwid.Canvas):
+        text, attr, cs = [], [], []
+        for row in canvas.content():
+            text.append(b''.join(run for _, _, run in row))
+            attr.append([(a, len(run)) for a, _, run in row])
+            cs.append([(c, len(run)) for _, c, run in row])
+        return urwid.TextCanvas(text, attr, cs, cursor=canvas.cursor, maxcol=canvas.cols(), check_width=False)
+
+    def invalidate(self):
+        self._canvases.clear()
+        self._invalidate()
+
+    def render(self, size, focus=False):
+        key = (size, focus)
+        if canvas := self._canvases.get(key):
+            self._canvases.move_to_end(key)
+        else:
+            canvas = self._copy(self._w.render(size, focus))
+            self._canvases[key] = canvas
+            if len(self._canvases) > self._cache_size:
+                self._canvases.popitem(last=False)
+        # new canvas for the urwid cache, the copy is never registered
+        return urwid.CompositeCanvas(canvas)
+
+    def keypress(self, size, key):
+        self.invalidate()
+        return self._w.keypress(size, key)
+
+    def mouse_event(self, size, event, button, col, row, focus):
+        self.invalidate()
+        if not hasattr(self._w, 'mouse_event'):
+            return False
+        return self._w.mouse_event(size, event, button, col, row, focus)
+
+
+class MenuSource():
+    """
+    Data source for big menus (see ConfigurableMenu.menu_setup_source),
+    the entries (label, action) are fetched in pages as they are shown,
+    'fetch(start, count)' returns a list or an awaitable (async source).
+    Type-ahead is enabled with 'labels' (all the labels, for the index).
+    """
+
+    def __init__(
+        self, size: int,
+        fetch: typing.Callable[[int, int], list | typing.Awaitable[list]], *,
+        labels: typing.Sequence[str] | None = None,
+        page_size=50, cache_pages=16,
+    ):
+        self._size = size
+        self._fetch = fetch
+        self._labels = labels
+        self._index: list[tuple[str, int]] | None = None
+        self._index_keys: list[str] | None = None
+        self._page_size = page_size
+        self._pages: collections.OrderedDict[int, list | None] = collections.OrderedDict()
+        self._cache_pages = cache_pages
+        self._pending: dict[int, asyncio.Future] = {}
+        self._cb_loaded = []
+
+    @property
+    def size(self):
+        return self._size
+
+    def get(self, position: int):
+        """
+        Get the entry, None if it's not available yet (the page is being
+        fetched, 'on_loaded' callbacks are called when done).
+        """
+        page, i = divmod(position, self._page_size)
+        if page in self._pages:
+            self._pages.move_to_end(page)
+            items = self._pages[page]
+            # failed (or short) pages are shown as '?' entries
+            return items[i] if items is not None and i < len(items) else ('?', None)
+        if page not in self._pending:
+            self._load(page)
+        if page in self._pages:
+            return self.get(position)
+        return None
+
+    def _load(self, page: int):
+        start = page * self._page_size
+        try:
+            res = self._fetch(start, min(self._page_size, self._size - start))
+        except Exception as e:
+            logger.exception("Menu source fetch failed", exc_info=e)
+            self._set_page(page, None)
+            return
+        if not inspect.isawaitable(res):
+            self._set_page(page, list(res))
+            return
+
+        def done(fut: asyncio.Future):
+            if self._pending.get(page) is not fut:
+                # invalidated meanwhile
+                return
+            del self._pending[page]
+            if fut.cancelled():
+                return
+            if e := fut.exception():
+                logger.exception("Menu source fetch failed", exc_info=e)
+                self._set_page(page, None)
+            else:
+                self._set_page(page, list(fut.result()))
+            for cb in list(self._cb_loaded):
+                cb(start, self._page_size)
+        fut = asyncio.ensure_future(res)
+        self._pending[page] = fut
+        fut.add_done_callback(done)
+
+    def _set_page(self, page: int, items: list | None):
+        self._pages[page] = items
+        if len(self._pages) > self._cache_pages:
+            self._pages.popitem(last=False)
+
+    def on_loaded(self, cb: typing.Callable[[int, int], typing.Any]):
+        """ Called with (start, count) when a page is fetched (async). """
+        self._cb_loaded.append(cb)
+
+    def off_loaded(self, cb: typing.Callable[[int, int], typing.Any]):
+        """ Remove a callback added with 'on_loaded'. """
+        if cb in self._cb_loaded:
+            self._cb_loaded.remove(cb)
+
+    def invalidate(self, size: int | None = None, labels: typing.Sequence[str] | None = None):
+        """ Drop all the fetched pages (the data changed), optional new size/labels. """
+        if size is not None:
+            self._size = size
+        if labels is not None:
+            self._labels = labels
+            self._index = self._index_keys = None
+        for fut in self._pending.values():
+            fut.cancel()
+        self._pending.clear()
+        self._pages.clear()
+
+    def find(self, prefix: str):
+        """ Position of the first label starting with 'prefix' (type-ahead). """
+        if self._labels is None:
+            return None
+        if self._index is None:
+            # sorted (case insensitive) index, built on the first search
+            self._index = sorted((l.casefold(), i) for i, l in enumerate(self._labels))
+            self._index_keys = [k for k, _ in self._index]
+        prefix = prefix.casefold()
+        j = bisect.bisect_left(self._index_keys, prefix)
+        if j < len(self._index) and self._index_keys[j].startswith(prefix):
+            return self._index[j][1]
+        return None
+
+
+class _MenuSourceListBox(VirtualListBox):
+    # type-ahead, printable keys (not used by the list) jump to the first
+    # matching entry, the typed prefix resets after a pause
+    type_ahead_timeout = 1.0
+
+    def __init__(self, body: VirtualListWalker, source: MenuSource):
+        super().__init__(body)
+        self._source = source
+        self._prefix = ''
+        self._prefix_time = 0.0
+
+    def keypress(self, size, key):
+        now = time.monotonic()
+        if now - self._prefix_time > self.type_ahead_timeout:
+            self._prefix = ''
+        # space is part of the prefix while typing (not a button click)
+        if key != ' ' or not self._prefix:
+            key = super().keypress(size, key)
+        if not isinstance(key, str) or len(key) != 1 or not key.isprintable():
+            return key
+        self._prefix_time = now
+        position = self._source.find(self._prefix + key)
+        if position is None and self._prefix:
+            # restart with the new key
+            position = self._source.find(key)
+            self._prefix = ''
+        if position is None:
+            return key
+        self._prefix += key
+        self.set_focus(position, 'below')
+        return None
+
+
 class BoxButton(urwid.WidgetWrap):
     # mixin signals from urwid.Button
     signals = urwid.Button.signals
@@ -207,32 +562,82 @@ class ConfigurableMenu(urwid.WidgetWrap):
     attr_focused = 'focused'
     attr_disabled = 'disabled'
 
+    class _Menu():
+        # the list widget is only built when the menu is first shown
+        def __init__(self, title: str, buttons: list, source: MenuSource | None = None):
+            self.title = title
+            self.buttons = buttons
+            self.source = source
+            self.walker: urwid.SimpleFocusListWalker | VirtualListWalker | None = None
+            self.w_list: urwid.ListBox | None = None
+            # source 'on_loaded' callback, removed when the menu is replaced
+            self.cb_loaded = None
+
     def __init__(self, root_key='menu', root_title='', ss_style=None):
         super().__init__(urwid.Pile([]))
         self.attr_focused = root_key + '.' + self.attr_focused
         self.attr_disabled = root_key + '.' + self.attr_disabled
-        self._w = ss_attr_map_style(self._w, 'button', ss_style or root_key)
-        self._menus = {}
-        self._stack = [root_key]
-        self.menu_setup(root_key, title=root_title)
-
-    def _menu_apply(self):
-        crumbs = '/'.join([self._menus[i][1] for i in self._stack])
-        crumbs = crumbs or '/'
-        w_back_btn = make_button(
+        # back button and breadcrumbs, reused for all the menus
+        self._w_back_btn = make_button(
             self.back_label,
             on_click=lambda w_btn: self._menu_pop(),
-            attr_map=None if len(self._stack) > 1 else self.attr_disabled,
+            attr_map=self.attr_disabled,
             focus_map=self.attr_focused,
         )
-        w_menu = self._menus[self._stack[-1]][0]
-        self._w.base_widget.contents = [
+        self._w_crumbs = urwid.Text('')
+        self._w.contents = [
             (urwid.Columns([
-                ('pack', w_back_btn),
-                ('weight', 1, urwid.Text(crumbs)),
+                ('pack', self._w_back_btn),
+                ('weight', 1, self._w_crumbs),
             ], 1), ('pack', None)),
-            (w_menu, ('weight', 1)),
+            (urwid.SolidFill(' '), ('weight', 1)),
         ]
+        self._w.focus_position = 1
+        self._w = ss_attr_map_style(self._w, 'button', ss_style or root_key)
+        self._menus: dict[str, ConfigurableMenu._Menu] = {}
+        self._stack = [root_key]
+        self.menu_setup(root_key, title=root_title)
+
+    def _make_button(self, button: tuple[str, str | typing.Callable[[], None]]):
+        label, click = button
+
+        def on_click(w_btn):
+            if isinstance(click, str):
+                self._menu_push(click)
+            elif callable(click):
+                click()
+        return make_button(label, on_click=on_click, focus_map=self.attr_focused)
+
+    def _menu_set(self, key: str, menu: '_Menu | None'):
+        old = self._menus.pop(key, None)
+        if old and old.cb_loaded:
+            old.source.off_loaded(old.cb_loaded)
+        if menu:
+            self._menus[key] = menu
+
+    def _menu_widget(self, key: str):
+        menu = self._menus[key]
+        if menu.w_list is None and menu.source:
+            source = menu.source
+
+            def create(position):
+                if button := source.get(position):
+                    return self._make_button(button)
+                # loading, replaced when the page is fetched
+                return make_button('\N{HORIZONTAL ELLIPSIS}', focus_map=self.attr_focused)
+            menu.walker = VirtualListWalker(source.size, create)
+            menu.w_list = _MenuSourceListBox(menu.walker, source)
+        elif menu.w_list is None:
+            menu.walker = urwid.SimpleFocusListWalker(list(map(self._make_button, menu.buttons)))
+            menu.w_list = urwid.ListBox(menu.walker)
+        return menu.w_list
+
+    def _menu_apply(self):
+        crumbs = '/'.join([self._menus[i].title for i in self._stack])
+        self._w_crumbs.set_text(crumbs or '/')
+        self._w_back_btn.set_attr_map({None: None if len(self._stack) > 1 else self.attr_disabled})
+        pile = self._w.base_widget
+        pile.contents[1] = (self._menu_widget(self._stack[-1]), ('weight', 1))
 
     def _menu_pop(self):
         if len(self._stack) > 1:
@@ -256,28 +661,74 @@ class ConfigurableMenu(urwid.WidgetWrap):
         buttons: list[tuple[str, str | typing.Callable[[], None]]] = [],
         append=True, replace=True,
     ):
-        if not replace and key in self._menus:
-            _, m_title, m_buttons = self._menus[key]
-            title = title or m_title
-            buttons = m_buttons + buttons if append else buttons + m_buttons
-
-        def on_click(n, w_btn):
-            click = buttons[n][1]
-            if isinstance(click, str):
-                self._menu_push(click)
-            elif callable(click):
-                click()
-        w_list = make_list_buttons(
-            [(label, {
-                'focus_map': self.attr_focused,
-            }) for label, click in buttons],
-            on_click,
-        )
+        menu = self._menus.get(key)
+        if menu and menu.source:
+            # source menu replaced by a regular menu
+            menu = None
+        if not replace and menu:
+            title = title or menu.title
+            buttons = menu.buttons + buttons if append else buttons + menu.buttons
+        title = key if title is None else title
+        buttons = list(buttons)
+
+        if not menu:
+            self._menu_set(key, ConfigurableMenu._Menu(title, buttons))
+        else:
+            if menu.walker is not None:
+                # update the built list, only the changed buttons (common
+                # prefix and suffix are kept, e.g. appends and removals)
+                old = menu.buttons
+                n = min(len(old), len(buttons))
+                p = 0
+                while p < n and old[p] == buttons[p]:
+                    p += 1
+                s = 0
+                while s < n - p and old[-1 - s] == buttons[-1 - s]:
+                    s += 1
+                if p + s < max(len(old), len(buttons)):
+                    menu.walker[p:len(old) - s] = list(map(self._make_button, buttons[p:len(buttons) - s]))
+            menu.title = title
+            menu.buttons = buttons
+        if key in self._stack:
+            self._menu_apply()
 
-        self._menus[key] = (w_list, key if title is None else title, buttons)
+    def menu_setup_source(
+        self, key: str, source: MenuSource, *,
+        title: str | None = None,
+        cb_draw_screen=None,
+    ):
+        """
+        Add/Replace a menu backed by a data source, only the visible entries
+        are created (virtual list), fetched in pages.
+        """
+        menu = ConfigurableMenu._Menu(key if title is None else title, [], source)
+        # weak, the source may outlive the menu (e.g. ui reset)
+        ref = weakref.ref(menu)
+
+        def loaded(start, count):
+            if not (menu := ref()):
+                source.off_loaded(loaded)
+                return
+            if not menu.walker:
+                return
+            for position in range(start, start + count):
+                if menu.walker.cached(position):
+                    menu.walker.invalidate(position)
+            if cb_draw_screen:
+                cb_draw_screen()
+        menu.cb_loaded = loaded
+        source.on_loaded(loaded)
+        self._menu_set(key, menu)
         if key in self._stack:
             self._menu_apply()
 
+    def menu_source_refresh(self, key: str):
+        """ Update a source menu after 'source.invalidate' (new data/size). """
+        menu = self._menus.get(key)
+        if menu and menu.source and menu.walker:
+            menu.walker.set_size(menu.source.size)
+            menu.walker.invalidate()
+
     def menu_setup_root(
         self, *,
         title: str | None = None,
@@ -291,7 +742,7 @@ class ConfigurableMenu(urwid.WidgetWrap):
 
     def menu_remove(self, key: str):
         if key != self._stack[0] and key in self._menus:
-            del self._menus[key]
+            self._menu_set(key, None)
             if key in self._stack:
                 self._stack = [i for i in self._stack if i != key]
                 self._menu_apply()
@@ -1,5 +1,9 @@
+import collections
+import contextlib
 import enum
+import time
 import typing
+import weakref
 
 import urwid
 
@@ -134,6 +138,7 @@ class Window():
         flags: WindowFlags = WindowFlags.DEFAULT,
         style: WindowStyle | bool = True,
         overlay: dict | bool = False,
+        release_after: float | None = None,
     ):
         self._id = __class__._id
         __class__._id += 1
@@ -141,11 +146,22 @@ class Window():
         self._parent: Window | None = None
         self._child: Window | None = None
         self._next: Window | None = None
-        self._w = w if isinstance(w, urwid.Widget) else w(self)
+        self._prev: Window | None = None
+        # a factory is only called when the window is first rendered, and
+        # again after the widget is released (see release_after)
+        self._w_factory = None if isinstance(w, urwid.Widget) else w
+        self._w = w if isinstance(w, urwid.Widget) else None
+        self._release_after = release_after
+        self._hidden_since: float | None = None
         self._title = title
         self._flags = flags
         self._style = style
         self._overlay = overlay
+        # render cache, managed by WindowManager
+        self._render_key = None
+        self._render_w: urwid.Widget | None = None
+        self._render_overlay: urwid.Overlay | None = None
+        self._render_overlay_kwargs: dict | None = None
 
     @property
     def parent(self):
@@ -159,6 +175,10 @@ class Window():
     def next_sibling(self):
         return self._next
 
+    @property
+    def prev_sibling(self):
+        return self._prev
+
     @property
     def children(self):
         if self._child:
@@ -178,6 +198,35 @@ class Window():
     def title(self):
         return 'WIN-%d' % self._id if self._title is None else self._title
 
+    @property
+    def widget(self):
+        """ The window widget, built from the factory if needed. """
+        if self._w is None:
+            self._w = self._w_factory(self)
+            self.on_build(WindowEvent(self))
+        return self._w
+
+    @property
+    def is_built(self):
+        return self._w is not None
+
+    def release(self):
+        """
+        Release the widget of a window created from a factory (if not
+        shown), it's built again when needed, 'on_build' is called again.
+        """
+        if self._w_factory is None or self._w is None:
+            return False
+        if self._manager and self in self._manager._rendered:
+            return False
+        self._w = None
+        self._hidden_since = None
+        self._render_key = None
+        self._render_w = None
+        self._render_overlay = None
+        self._render_overlay_kwargs = None
+        return True
+
     @property
     def flags(self):
         return self._flags
@@ -197,6 +246,10 @@ class Window():
             self._style = style
         if overlay != -1:
             self._overlay = overlay
+        # always rebuild, modify() can be used to force a rebuild of the
+        # window decorations (e.g. custom styles with other state)
+        self._render_key = None
+        self._render_w = None
         if self._manager:
             self._manager._update()
 
@@ -212,14 +265,9 @@ class Window():
 
     @property
     def is_active_child(self):
-        if self._manager and not self._child:
-            wd = self._manager._active
-            if wd == self:
-                return True
-            while wd := wd._child:
-                if wd == self:
-                    return True
-        return False
+        # the active child is the end of the active path (first children
+        # starting at the active window)
+        return bool(self._manager) and self._manager._active_child == self
 
     @property
     def is_active_parent(self):
@@ -227,7 +275,11 @@ class Window():
             return False
         if self._manager._active == self:
             return True
-        return any(map(lambda wd: wd.is_active_child, self.children))
+        return self._manager._active_child._parent == self
+
+    @property
+    def is_active_path(self):
+        return bool(self._manager) and self in self._manager._active_path
 
     def set_active(self):
         if self._manager:
@@ -250,20 +302,26 @@ class Window():
         assert (wd._parent is None)
         assert (wd._child is None)
         assert (wd._next is None)
+        assert (wd._prev is None)
 
-        # add child to top
-        wd._next = self._child
-        self._child = wd
+        with self._manager.batch():
+            # add child to top
+            wd._next = self._child
+            if self._child:
+                self._child._prev = wd
+            self._child = wd
 
-        wd._parent = self
-        wd._manager = self._manager
-        wd._manager._update()
+            wd._parent = self
+            wd._manager = self._manager
+            if wd._release_after is not None and wd._w_factory:
+                wd._manager._releasable.add(wd)
+            wd._manager._update()
 
-        # call on_open handler
-        wd.on_open(WindowEvent(wd))
+            # call on_open handler
+            wd.on_open(WindowEvent(wd))
 
-        if active:
-            wd.set_active()
+            if active:
+                wd.set_active()
 
     def make_window(
         self, w: urwid.Widget | typing.Callable[['Window'], urwid.Widget], *,
@@ -271,9 +329,10 @@ class Window():
         flags: WindowFlags = WindowFlags.DEFAULT,
         style: WindowStyle | bool = True,
         overlay: dict | bool = False,
+        release_after: float | None = None,
         active=True,
     ):
-        wd = Window(w, title=title, flags=flags, style=style, overlay=overlay)
+        wd = Window(w, title=title, flags=flags, style=style, overlay=overlay, release_after=release_after)
         self.open_window(wd, active=active)
         return wd
 
@@ -283,9 +342,10 @@ class Window():
         return default if self._overlay else None
 
     def _render(self, style: WindowStyle | None):
+        w = self.widget
         if self._style == True:
-            return style.render(self, self._w) if style else self._w
-        return self._style.render(self, self._w) if self._style else self._w
+            return style.render(self, w) if style else w
+        return self._style.render(self, w) if self._style else w
 
     def _destroy(self):
         assert (self._parent)
@@ -302,19 +362,23 @@ class Window():
             (self._next or self._parent).set_active()
 
         # remove from parent child list
-        pc = self._parent._child
-        assert (pc)
-        if pc == self:
-            self._parent._child = self._next
+        if self._prev:
+            assert (self._prev._next == self)
+            self._prev._next = self._next
         else:
-            assert (pc._next)
-            while pc._next != self:
-                pc = pc._next
-                assert (pc._next)
-            assert (pc._next == self)
-            pc._next = self._next
+            assert (self._parent._child == self)
+            self._parent._child = self._next
+        if self._next:
+            self._next._prev = self._prev
         self._next = None
+        self._prev = None
         self._parent = None
+        self._manager._releasable.discard(self)
+        self._hidden_since = None
+        self._render_key = None
+        self._render_w = None
+        self._render_overlay = None
+        self._render_overlay_kwargs = None
 
         try:
             self._manager._update()
@@ -338,7 +402,8 @@ class Window():
             return False
 
         # not cancelled, destroy
-        self._destroy()
+        with self._manager.batch():
+            self._destroy()
         return True
 
     def on_open(self, ev: WindowEvent):
@@ -357,6 +422,11 @@ class Window():
         if self._parent:
             self._parent.on_destroy(ev)
 
+    def on_build(self, ev: WindowEvent):
+        # the widget was built (first render or after release)
+        if self._parent:
+            self._parent.on_build(ev)
+
 
 class WindowManagerStyle():
     def render(self, wm: 'WindowManager', w: urwid.Widget):
@@ -366,28 +436,82 @@ class WindowManagerStyle():
 class TaskBarWMS(WindowManagerStyle):
     def __init__(self, label_len=15):
         self._label_len = label_len
+        # cached buttons (per window, weak references to not keep closed
+        # windows) and last task bar, one style instance per manager
+        self._buttons = weakref.WeakKeyDictionary()
+        self._bar = None
+
+    def _button(self, wd: Window):
+        l = wd.title
+        active = wd.is_active_parent
+        if (cached := self._buttons.get(wd)) and cached[0] == (l, active):
+            return cached[1]
+        key = (l, active)
+        if self._label_len > 0 and len(l) > self._label_len:
+            l = l[:self._label_len - 1] + '\N{HORIZONTAL ELLIPSIS}'
+        w_close = urwid.Button('[%s]' % l if active else l)
+        ref = weakref.ref(wd)
+        urwid.connect_signal(w_close, 'click', lambda w: (wd := ref()) and wd.set_active())
+        self._buttons[wd] = (key, w_close)
+        return w_close
 
     def render(self, wm, w):
-        def btn(wd: Window):
-            l = wd.title
-            if self._label_len > 0 and len(l) > self._label_len:
-                l = l[:self._label_len - 1] + '\N{HORIZONTAL ELLIPSIS}'
-            w_close = urwid.Button('[%s]' % l if wd.is_active_parent else l)
-            urwid.connect_signal(w_close, 'click', lambda w: wd.set_active())
-            return 'pack', w_close
         w = super().render(wm, w)
         wd_list = list(filter(
             lambda wd: WindowFlags.WMS_TASK in wd.flags,
             wm.root.children,
         ))
         if len(wd_list) <= 1:
+            self._bar = None
             return w
-        return urwid.Pile([
-            w, ('pack', urwid.Columns(map(btn, reversed(wd_list)), 1)),
+        buttons = [self._button(wd) for wd in reversed(wd_list)]
+        if (cached := self._bar) and cached[0] is w and cached[1] == buttons:
+            return cached[2]
+        w_bar = urwid.Pile([
+            w, ('pack', urwid.Columns([('pack', b) for b in buttons], 1)),
         ])
+        self._bar = (w, buttons, w_bar)
+        return w_bar
 
 
 class WindowManager():
+    class _ToastOverlay(urwid.Overlay):
+        # toasts (top) over the windows (bottom), unlike urwid.Overlay the
+        # focus and the input stay on the windows
+        @property
+        def focus(self):
+            return self.bottom_w
+
+        def selectable(self):
+            return self.bottom_w.selectable()
+
+        def render(self, size, focus=False):
+            left, right, top, bottom = self.calculate_padding_filler(size, focus)
+            bottom_c = self.bottom_w.render(size, focus)
+            if not bottom_c.cols() or not bottom_c.rows():
+                return urwid.CompositeCanvas(bottom_c)
+            top_c = urwid.CompositeCanvas(self.top_w.render(
+                self.top_w_size(size, left, right, top, bottom), False,
+            ))
+            if left < 0 or right < 0:
+                top_c.pad_trim_left_right(min(0, left), min(0, right))
+            if top < 0 or bottom < 0:
+                top_c.pad_trim_top_bottom(min(0, top), min(0, bottom))
+            return urwid.CanvasOverlay(top_c, bottom_c, left, top)
+
+        def keypress(self, size, key):
+            return self.bottom_w.keypress(size, key)
+
+        def mouse_event(self, size, event, button, col, row, focus):
+            if not hasattr(self.bottom_w, 'mouse_event'):
+                return False
+            return self.bottom_w.mouse_event(size, event, button, col, row, focus)
+
+        def get_cursor_coords(self, size):
+            if not hasattr(self.bottom_w, 'get_cursor_coords'):
+                return None
+            return self.bottom_w.get_cursor_coords(size)
+
     class _WindowCloser(urwid.WidgetPlaceholder):
         def __init__(self, wd: 'Window', w: urwid.Widget):
             super().__init__(w)
@@ -400,7 +524,6 @@ class WindowManager():
                 return None
             return key
 
-    _default_style = TaskBarWMS()
     _default_window_style = TitleBarWS()
     _default_window_overlay = {
         'align': 'center',
@@ -408,14 +531,27 @@ class WindowManager():
         'valign': 'middle',
         'height': 'pack',
     }
+    _toast_overlay = {
+        'align': 'right',
+        'width': ('relative', 40),
+        'valign': 'bottom',
+        'height': 'pack',
+        'right': 1,
+        'bottom': 1,
+    }
+    toast_max = 5
+    toast_timeout = 5.0
 
     def __init__(
         self, *,
-        style: WindowManagerStyle | None = _default_style,
+        style: WindowManagerStyle | bool | None = None,
         window_style: WindowStyle | None = _default_window_style,
         window_overlay: dict = _default_window_overlay,
+        cb_call_later: typing.Callable[[float, typing.Callable[[], typing.Any]], typing.Any] | None = None,
     ):
-        self._style = style
+        # styles keep state (cached widgets), default one per manager,
+        # False for no style
+        self._style = TaskBarWMS() if style is None else style
         self._window_style = window_style
         self._window_overlay = window_overlay
         self._root = Window(urwid.Overlay(
@@ -426,6 +562,27 @@ class WindowManager():
         # root window has no parent but has manager
         self._root._manager = self
         self._active = self._root
+        # active path, from the active window to the active child (first
+        # children), updated on every change (see _update)
+        self._active_path = {self._root}
+        self._active_child = self._root
+        # batch depth and pending render, see batch()
+        self._batch = 0
+        self._batch_update = False
+        # toasts, (text, attr) -> [count, expire time, widget], expired with
+        # one shared timer (cb_call_later, without it only replaced)
+        self._toasts: collections.OrderedDict[tuple, list] = collections.OrderedDict()
+        self._w_toasts = urwid.Pile([])
+        self._w_toasts_overlay: WindowManager._ToastOverlay | None = None
+        self._cb_call_later = cb_call_later
+        self._toast_handle = None
+        self._toast_due = 0.0
+        # windows rendered on the last update, and the windows to release
+        # when not rendered for a while (Window release_after)
+        self._rendered: set[Window] = set()
+        self._releasable: set[Window] = set()
+        self._release_handle = None
+        self._release_due = 0.0
         self._widget = urwid.WidgetPlaceholder(self._render())
 
     @property
@@ -441,24 +598,45 @@ class WindowManager():
         return self._widget
 
     def _render(self):
+        # the window widgets are cached (per window) and only rebuilt when
+        # the state used by the styles changes, the overlays are re-linked,
+        # unchanged widgets keep their cached canvases
+
+        rendered = set()
+
         def render_wd(wd: Window, top=False):
-            if top and WindowFlags.ESC_CLOSE in wd.flags:
-                return __class__._WindowCloser(wd, wd._render(self._window_style))
-            return wd._render(self._window_style)
+            rendered.add(wd)
+            key = (
+                wd.title, wd._flags, wd._style, self._window_style,
+                wd.is_overlay, wd.is_active_child,
+                top and WindowFlags.ESC_CLOSE in wd._flags,
+            )
+            if wd._render_w is None or wd._render_key != key:
+                w = wd._render(self._window_style)
+                if key[-1]:
+                    w = __class__._WindowCloser(wd, w)
+                wd._render_key = key
+                wd._render_w = w
+            return wd._render_w
 
         def render_down(wd: Window, top=False):
             if ol_kwargs := wd._overlay_kwargs(self._window_overlay):
                 # overlay window
                 assert (wd._parent)
-                return urwid.Overlay(
-                    # top widget (self)
-                    render_wd(wd, top),
-                    # bottom widget (recursive render)
-                    render_up(wd._next) if wd._next
-                    else render_down(wd._parent),
-                    # overlay kwargs
-                    **ol_kwargs,
-                )
+                # top widget (self)
+                w_top = render_wd(wd, top)
+                # bottom widget (recursive render)
+                w_bottom = render_up(wd._next) if wd._next else render_down(wd._parent)
+                ov = wd._render_overlay
+                if ov is None or wd._render_overlay_kwargs != ol_kwargs:
+                    ov = urwid.Overlay(w_top, w_bottom, **ol_kwargs)
+                    wd._render_overlay = ov
+                    wd._render_overlay_kwargs = ol_kwargs
+                elif ov.top_w is not w_top or ov.bottom_w is not w_bottom:
+                    ov.top_w = w_top
+                    ov.bottom_w = w_bottom
+                    ov._invalidate()
+                return ov
             # full window (stop rendering)
             return render_wd(wd, top)
 
@@ -469,7 +647,131 @@ class WindowManager():
             return render_down(wd, True)
 
         w = render_up(self._active)
-        return self._style.render(self, w) if self._style else w
+        w = self._style.render(self, w) if self._style else w
+        self._rendered = rendered
+        self._release_track()
+        if not self._toasts:
+            return w
+        ov = self._w_toasts_overlay
+        if ov is None:
+            ov = __class__._ToastOverlay(self._w_toasts, w, **self._toast_overlay)
+            self._w_toasts_overlay = ov
+        elif ov.bottom_w is not w:
+            ov.bottom_w = w
+            ov._invalidate()
+        return ov
+
+    def _update_active_path(self):
+        wd = self._active
+        path = {wd}
+        while wd._child:
+            wd = wd._child
+            path.add(wd)
+        self._active_path = path
+        self._active_child = wd
+
+    def notify(self, text: str, *, attr=None, timeout: float | None = None):
+        """
+        Show a toast (non-interactive message) for 'timeout' seconds, at
+        most 'toast_max' are shown (the oldest are dropped), identical
+        messages are shown once with a count.
+        """
+        key = (text, attr)
+        expire = time.monotonic() + (self.toast_timeout if timeout is None else timeout)
+        if toast := self._toasts.pop(key, None):
+            toast[0] += 1
+            toast[1] = max(toast[1], expire)
+            toast[2].base_widget.set_text('%s (x%d)' % (text, toast[0]))
+        else:
+            toast = [1, expire, urwid.AttrMap(urwid.Padding(urwid.Text(text), left=1, right=1), attr)]
+        self._toasts[key] = toast
+        while len(self._toasts) > self.toast_max:
+            self._toasts.popitem(last=False)
+        self._toast_update()
+
+    def notify_clear(self):
+        self._toasts.clear()
+        self._toast_update()
+
+    def _toast_update(self):
+        self._w_toasts.contents = [(t[2], ('pack', None)) for t in self._toasts.values()]
+        if self._toasts and self._cb_call_later:
+            due = min(t[1] for t in self._toasts.values())
+            if not self._toast_handle or due < self._toast_due:
+                if self._toast_handle:
+                    self._toast_handle.cancel()
+                self._toast_due = due
+                self._toast_handle = self._cb_call_later(max(0.0, due - time.monotonic()), self._toast_expire)
+        self._update()
+
+    def _toast_expire(self):
+        self._toast_handle = None
+        now = time.monotonic()
+        for key in [k for k, t in self._toasts.items() if t[1] <= now]:
+            del self._toasts[key]
+        self._toast_update()
+
+    def _release_track(self):
+        # mark the hidden windows and schedule the release of the oldest
+        if not self._releasable:
+            return
+        now = time.monotonic()
+        due = None
+        for wd in self._releasable:
+            if wd in self._rendered or wd._w is None:
+                wd._hidden_since = None
+                continue
+            if wd._hidden_since is None:
+                wd._hidden_since = now
+            t = wd._hidden_since + wd._release_after
+            due = t if due is None else min(due, t)
+        if due is not None and self._cb_call_later:
+            if not self._release_handle or due < self._release_due:
+                if self._release_handle:
+                    self._release_handle.cancel()
+                self._release_due = due
+                self._release_handle = self._cb_call_later(max(0.0, due - now), self._release_expire)
+
+    def _release_expire(self):
+        self._release_handle = None
+        now = time.monotonic()
+        released = False
+        for wd in list(self._releasable):
+            if wd._hidden_since is not None and now - wd._hidden_since >= wd._release_after:
+                released = wd.release() or released
+        if released:
+            # the overlays of the other hidden windows may still reference
+            # the released widgets (bottom widget), rebuilt when shown
+            stack = [self._root]
+            while stack:
+                wd = stack.pop()
+                if wd not in self._rendered:
+                    wd._render_overlay = None
+                    wd._render_overlay_kwargs = None
+                stack.extend(wd.children)
+        self._release_track()
+
+    @contextlib.contextmanager
+    def batch(self):
+        """
+        Defer the window updates (render) until the outermost batch exits,
+        for multiple window changes (open, close, modify, set_active).
+        """
+        self._batch += 1
+        try:
+            yield self
+        finally:
+            self._batch -= 1
+            if not self._batch and self._batch_update:
+                self._update()
 
     def _update(self):
-        self._widget.original_widget = self._render()
+        # the active path is always updated (used by the queries)
+        self._update_active_path()
+        if self._batch:
+            self._batch_update = True
+            return
+        self._batch_update = False
+        w = self._render()
+        if w is not self._widget.original_widget:
+            self._widget.original_widget = w
@@ -1,15 +1,25 @@
 import asyncio
 import contextlib
+import hashlib
+import logging
+import marshal
+import os
+import time
+import tomllib
 import typing
 
 import evdev
 import toml
 import urwid
 
+from .linux.input import event_device_set_keymap
 from .linux.rc import RCDevice
 from .pkg.evdev import evdev_open_device
+from .pkg.urwid import VirtualListBox, VirtualListWalker
 from .rc_monitor import rc_monitor
 
+logger = logging.getLogger(__name__)
+
 # https://git.linuxtv.org/v4l-utils.git/
 # https://git.linuxtv.org/v4l-utils.git/tree/utils/keytable
 # https://git.linuxtv.org/v4l-utils.git/tree/utils/keytable/keytable.c
@@ -53,93 +63,288 @@ class RCKeymap():
     }
 
     @staticmethod
-    def _validate(o, f='', s=_schema):
+    def _compile(f='', s=_schema):
         # a bespoke validator and converter based on a schema
-        # to validate the keymap file contents
+        # to validate the keymap file contents, the schema is compiled
+        # into a python function (specialized nested loops, no closures
+        # or schema lookups while validating)
 
         k_ = 'k' + f if f else None
-
-        def p(o, s):
-            if not isinstance(o, s['t']):
-                raise ValueError()
+        lines = ['def validate(o):']
+        consts = {}
+        n = 0
+
+        def const(v):
+            name = '_c%d' % len(consts)
+            consts[name] = v
+            return name
+
+        def var(prefix):
+            nonlocal n
+            n += 1
+            return '%s%d' % (prefix, n)
+
+        def emit(d, line):
+            lines.append('    ' * d + line)
+
+        def p(src, s, d):
+            # emit code to validate 'src', returns the result variable
+            emit(d, 'if not isinstance(%s, %s): raise ValueError()' % (src, const(s['t'])))
             if s['t'] == dict:
-                def kv(kv):
-                    k, v = kv
-                    if f != '<' and not isinstance(k, str):
-                        raise ValueError()
-                    if 'v' in s and k in s['v']:
-                        v = p(v, s['v'][k])
-                    elif '*' in s:
-                        v = p(v, s['*'])
-                    if k_ and k_ in s:
-                        k = s[k_](k)
-                    return k, v
-                return {k: v for k, v in map(kv, o.items())}
+                res, k, v = var('r'), var('k'), var('v')
+                emit(d, '%s = {}' % res)
+                emit(d, 'for %s, %s in %s.items():' % (k, v, src))
+                if f != '<':
+                    emit(d + 1, 'if not isinstance(%s, str): raise ValueError()' % k)
+                branch = 'if'
+                for vk, vs in s.get('v', {}).items():
+                    emit(d + 1, '%s %s == %r:' % (branch, k, vk))
+                    if (r := p(v, vs, d + 2)) != v:
+                        emit(d + 2, '%s = %s' % (v, r))
+                    branch = 'elif'
+                if '*' in s:
+                    if branch == 'elif':
+                        emit(d + 1, 'else:')
+                    dd = d + 2 if branch == 'elif' else d + 1
+                    if (r := p(v, s['*'], dd)) != v:
+                        emit(dd, '%s = %s' % (v, r))
+                if k_ and k_ in s:
+                    emit(d + 1, '%s = %s(%s)' % (k, const(s[k_]), k))
+                emit(d + 1, '%s[%s] = %s' % (res, k, v))
+                return res
             if s['t'] == list:
-                return [p(v, s['*']) for v in o]
-            return o
-        return p(o, s)
+                res, v = var('r'), var('v')
+                emit(d, '%s = []' % res)
+                emit(d, 'for %s in %s:' % (v, src))
+                emit(d + 1, '%s.append(%s)' % (res, p(v, s['*'], d + 1)))
+                return res
+            return src
+
+        emit(1, 'return %s' % p('o', s, 1))
+        exec(compile('\n'.join(lines), '<rc_keymap_validate%s>' % f, 'exec'), consts)
+        return consts['validate']
+
+    _compiled = {}
+    # mtime granularity can be coarse (2s on FAT, e.g. the boot partition),
+    # a rewrite within the same tick keeps the mtime
+    _cache_mtime_window = 3 * 10**9
+
+    @classmethod
+    def _validate(cls, o, f=''):
+        if f not in cls._compiled:
+            cls._compiled[f] = cls._compile(f)
+        return cls._compiled[f](o)
 
     def __init__(self):
         self._data = {}
+        self._index_rebuild()
+
+    def _index_rebuild(self):
+        # indexes kept in step with _data (the file contents), so that
+        # lookups and updates don't need to scan the protocol list
+        # (proto, scancode) -> key
+        self._sc_key: dict[tuple[str, int], str] = {}
+        # (proto, scancode) -> protocol dict where the scancode is stored
+        self._sc_protocol: dict[tuple[str, int], dict] = {}
+        # key -> (proto, scancode) ordered set
+        self._key_sc: dict[str, dict[tuple[str, int], None]] = {}
+        # proto -> protocol dict for new scancodes (first on the file)
+        self._protocols: dict[str, dict] = {}
+        # duplicated (proto, scancode) on the file with different keys
+        self._conflicts: list[tuple[str, int, str, str]] = []
+        for protocol in self._data.get('protocols', []):
+            if 'protocol' not in protocol:
+                continue
+            proto = protocol['protocol']
+            self._protocols.setdefault(proto, protocol)
+            for scancode, key in protocol.get('scancodes', {}).items():
+                sc = proto, scancode
+                if sc in self._sc_key:
+                    # the last one wins (same as ir-keytable), drop the
+                    # shadowed one to keep _data and the indexes in step
+                    if self._sc_key[sc] != key:
+                        self._conflicts.append((proto, scancode, self._sc_key[sc], key))
+                    logger.warning("Duplicated scancode %s 0x%x, '%s' replaces '%s' (removed on save)" % (
+                        proto, scancode, key, self._sc_key[sc],
+                    ))
+                    del self._sc_protocol[sc]['scancodes'][scancode]
+                    self._index_remove(sc)
+                self._index_add(sc, key, protocol)
+
+    def _index_add(self, sc: tuple[str, int], key: str, protocol: dict):
+        self._sc_key[sc] = key
+        self._sc_protocol[sc] = protocol
+        self._key_sc.setdefault(key, {})[sc] = None
+
+    def _index_remove(self, sc: tuple[str, int]):
+        key = self._sc_key.pop(sc)
+        del self._sc_protocol[sc]
+        key_scs = self._key_sc[key]
+        del key_scs[sc]
+        if not key_scs:
+            del self._key_sc[key]
+        return key
 
-    def load(self, file):
-        with open(file, 'r') as fp:
-            data = toml.load(fp)
-        self._data = self.__class__._validate(data, '>')
+    @staticmethod
+    def _cache_file(cache_dir: str, file: str):
+        # one cache per keymap file (absolute path)
+        path_hash = hashlib.blake2b(os.fsencode(os.path.abspath(file)), digest_size=8).hexdigest()
+        return os.path.join(cache_dir, 'rc_keymap.%s.%s.cache' % (os.path.basename(file), path_hash))
+
+    @staticmethod
+    def _cache_read(cache_dir: str, file: str):
+        # a cache of the validated contents, stored on 'cache_dir' and keyed
+        # by mtime/size (fast path) and content hash, the mtime is only kept
+        # when it was older than _cache_mtime_window
+        try:
+            with open(__class__._cache_file(cache_dir, file), 'rb') as fp:
+                cache = marshal.load(fp)
+            if isinstance(cache, tuple) and len(cache) == 5 and cache[0] == marshal.version:
+                return cache
+        except (OSError, EOFError, ValueError, TypeError):
+            pass
+        return None
 
-    def save(self, file, trim=True):
-        data = self.__class__._validate(self._data, '<')
+    @staticmethod
+    def _cache_write(cache_dir: str, file: str, st: os.stat_result, digest: bytes, data: dict):
+        cache_file = __class__._cache_file(cache_dir, file)
+        # recent mtime, the file can still change without a new mtime, the
+        # next load checks the hash (and stores the mtime if old enough)
+        mtime = st.st_mtime_ns if time.time_ns() - st.st_mtime_ns > __class__._cache_mtime_window else None
+        try:
+            os.makedirs(cache_dir, exist_ok=True)
+            with open(cache_file + '.tmp', 'wb') as fp:
+                marshal.dump((marshal.version, mtime, st.st_size, digest, data), fp)
+            os.replace(cache_file + '.tmp', cache_file)
+        except OSError as e:
+            # the cache is optional
+            logger.warning("Failed to write keymap cache '%s'" % cache_file)
+            logger.warning(e)
+
+    def load(self, file, cache_dir: str | None = None):
+        """ Load a keymap file, 'cache_dir' enables the cache of the parsed file. """
+        with open(file, 'rb') as fp:
+            st = os.fstat(fp.fileno())
+            cached = self._cache_read(cache_dir, file) if cache_dir else None
+            if cached and cached[1:3] == (st.st_mtime_ns, st.st_size):
+                self._data = cached[4]
+            else:
+                raw = fp.read()
+                digest = hashlib.blake2b(raw, digest_size=16).digest()
+                if cached and cached[3] == digest:
+                    # same contents (e.g. touched), just update the key
+                    self._data = cached[4]
+                else:
+                    # tomllib (stdlib) is much faster than the toml package
+                    data = tomllib.loads(raw.decode())
+                    self._data = self.__class__._validate(data, '>')
+                if cache_dir:
+                    self._cache_write(cache_dir, file, st, digest, self._data)
+        self._index_rebuild()
+
+    def save(self, file, trim=True, cache_dir: str | None = None):
+        # trimmed on the loaded form, also the cached contents
+        data = self._data
         if trim:
             def is_proto(p):
                 return 'scancodes' in p and p['scancodes']
             if 'protocols' in data:
-                data['protocols'] = list(
+                data = {**data, 'protocols': list(
                     filter(lambda x: is_proto(x), data['protocols'])
-                )
+                )}
                 if not data['protocols']:
                     del data['protocols']
-        with open(file, 'w') as fp:
-            toml.dump(data, fp)
+        raw = toml.dumps(self.__class__._validate(data, '<')).encode()
+        with open(file, 'wb') as fp:
+            fp.write(raw)
+            st = os.fstat(fp.fileno())
+        if cache_dir:
+            # the next load will hit the cache
+            self._cache_write(cache_dir, file, st, hashlib.blake2b(raw, digest_size=16).digest(), data)
+
+    def __len__(self):
+        return len(self._sc_key)
 
     def all_scancodes(self):
-        if 'protocols' not in self._data:
-            return
-        for protocol in self._data['protocols']:
-            if 'protocol' not in protocol or 'scancodes' not in protocol:
-                continue
-            proto = protocol['protocol']
-            for scancode, key in protocol['scancodes'].items():
-                yield proto, scancode, key
+        for (proto, scancode), key in self._sc_key.items():
+            yield proto, scancode, key
 
     def all_scancodes_by_key(self):
-        res = {}
-        for proto, scancode, key in self.all_scancodes():
-            if key not in res:
-                res[key] = []
-            res[key].append((proto, scancode))
+        return {key: list(scs) for key, scs in self._key_sc.items()}
+
+    def keys(self):
+        return self._key_sc.keys()
+
+    def get_key(self, proto: str, scancode: int):
+        return self._sc_key.get((proto, scancode))
+
+    def key_scancodes(self, key: str):
+        return list(self._key_sc.get(key, ()))
+
+    def conflicts(self, items: typing.Iterable[tuple[str, int, str]] | None = None):
+        """
+        Find (proto, scancode) already set to a different key, returns a list
+        of (proto, scancode, current key, new key). Without 'items' returns
+        the conflicts found when loading (duplicated scancodes on the file).
+        """
+        if items is None:
+            return list(self._conflicts)
+        res = []
+        for proto, scancode, key in items:
+            current = self._sc_key.get((proto, scancode))
+            if current is not None and current != key:
+                res.append((proto, scancode, current, key))
         return res
 
     def set_scancode(self, proto: str, scancode: int, key: str):
-        if 'protocols' not in self._data:
-            self._data['protocols'] = []
-        protocol = next(
-            (p for p in self._data['protocols'] if 'protocol' in p and p['protocol'] == proto), None)
-        if not protocol:
-            protocol = {'protocol': proto}
-            self._data['protocols'].append(protocol)
-        if 'scancodes' not in protocol:
-            protocol['scancodes'] = {}
-        protocol['scancodes'][scancode] = key
+        """ Set scancode, returns the previous key (if any). """
+        sc = proto, scancode
+        if sc in self._sc_key:
+            protocol = self._sc_protocol[sc]
+            prev = self._index_remove(sc)
+        else:
+            prev = None
+            if proto not in self._protocols:
+                protocol = {'protocol': proto}
+                self._data.setdefault('protocols', []).append(protocol)
+                self._protocols[proto] = protocol
+            protocol = self._protocols[proto]
+        protocol.setdefault('scancodes', {})[scancode] = key
+        self._index_add(sc, key, protocol)
+        return prev
+
+    def set_scancodes(self, items: typing.Iterable[tuple[str, int, str]], replace=True):
+        """
+        Set multiple scancodes, if not 'replace' scancodes already set to a
+        different key are skipped. Returns the conflicts (see 'conflicts').
+        """
+        res = []
+        for proto, scancode, key in items:
+            current = self._sc_key.get((proto, scancode))
+            if current is not None and current != key:
+                res.append((proto, scancode, current, key))
+                if not replace:
+                    continue
+            self.set_scancode(proto, scancode, key)
+        return res
+
+    def clear_scancode(self, proto: str, scancode: int):
+        """ Clear scancode, returns the previous key (if any). """
+        sc = proto, scancode
+        if sc not in self._sc_key:
+            return None
+        del self._sc_protocol[sc]['scancodes'][scancode]
+        return self._index_remove(sc)
 
     def clear_key_scancodes(self, key: str):
-        if 'protocols' not in self._data:
-            return
-        for protocol in self._data['protocols']:
-            if 'scancodes' in protocol:
-                protocol['scancodes'] = {
-                    sc: k for sc, k in protocol['scancodes'].items() if k != key
-                }
+        """ Clear all the scancodes of a key, returns how many. """
+        scs = self.key_scancodes(key)
+        for proto, scancode in scs:
+            self.clear_scancode(proto, scancode)
+        return len(scs)
+
+    def clear_keys_scancodes(self, keys: typing.Iterable[str]):
+        return sum(map(self.clear_key_scancodes, keys))
 
     def clear_all_scancodes(self):
         if 'protocols' not in self._data:
@@ -147,6 +352,58 @@ class RCKeymap():
         for protocol in self._data['protocols']:
             if 'scancodes' in protocol:
                 protocol['scancodes'] = {}
+        self._index_rebuild()
+
+
+def _rc_proto_norm(proto: str):
+    # keymaps may use aliases of the sysfs names (e.g. rc5, RC-5, rc_5)
+    return proto.lower().replace('-', '').replace('_', '')
+
+
+def rc_keymap_protocols(keymap: RCKeymap):
+    return {proto for proto, _, _ in keymap.all_scancodes()}
+
+
+def rc_device_narrow_protocols(dev: RCDevice, keymap: RCKeymap):
+    """
+    Enable only the rc protocols (kernel decoders) used by the keymap, every
+    other decoder is disabled. Nothing changes if the keymap is empty.
+
+    Returns the list of enabled protocols and the number of disabled ones.
+    """
+    used = set(map(_rc_proto_norm, rc_keymap_protocols(keymap)))
+    proto_org = dev.protocols
+    if not used:
+        return [p for p, on in proto_org if on], 0
+    # 'lirc' is not a decoder (raw events to the lirc device), keep it
+    proto_new = [
+        (p, on if p == 'lirc' else _rc_proto_norm(p) in used)
+        for p, on in proto_org
+    ]
+    disabled = sum(1 for (_, on_o), (_, on_n) in zip(proto_org, proto_new) if on_o and not on_n)
+    if proto_new != proto_org:
+        dev.protocols = proto_new
+    return [p for p, on in proto_new if on], disabled
+
+
+def rc_device_apply_keymap(dev: RCDevice, keymap: RCKeymap):
+    """
+    Load the keymap into the kernel (rc input device keymap) at runtime,
+    replacing the current one. Keys unknown to evdev are ignored.
+
+    Returns the number of scancodes set and removed.
+    """
+    if not dev.input0 or not (dev_event := dev.input0.event0):
+        raise RuntimeError("RC device '%s' has no input device" % dev.path)
+    keycodes = {}
+    for proto, scancode, key in keymap.all_scancodes():
+        if key in evdev.ecodes.ecodes:
+            keycodes[scancode] = evdev.ecodes.ecodes[key]
+    fd = os.open(dev_event.dev_path, os.O_RDONLY | os.O_CLOEXEC)
+    try:
+        return event_device_set_keymap(fd, keycodes)
+    finally:
+        os.close(fd)
 
 
 class _KeyWidget(urwid.Columns):
@@ -184,41 +441,91 @@ class _KeyWidget(urwid.Columns):
 
 
 class _KeyListWidget(urwid.ScrollBar):
-    def __init__(self, key_scodes, *, cb_add, cb_clear):
+    def __init__(self, keys, *, cb_add, cb_clear):
         self._cb_add = cb_add
         self._cb_clear = cb_clear
-        self._key_widgets = {}
-        self._w_walker = urwid.SimpleFocusListWalker([])
-        self.set_key_scodes(key_scodes)
-        super().__init__(urwid.ListBox(self._w_walker))
-
-    def set_key_scodes(self, key_scodes, new_set_focus=False):
-        key_scodes = dict(key_scodes)
-        # update
-        for key, w in self._key_widgets.items():
-            w.set_scodes(key_scodes.pop(key, None))
-        # add new
-        if key_scodes:
-            for key, scodes in key_scodes.items():
-                self._key_widgets[key] = _KeyWidget(
-                    key, scodes,
-                    cb_add=self._cb_add, cb_clear=self._cb_clear,
-                )
-                self._w_walker.append(self._key_widgets[key])
+        self._keymap: RCKeymap | None = None
+        self._keys = []
+        self._key_pos = {}
+        # rows are only created when visible, backed by the keymap index
+        self._w_walker = VirtualListWalker(0, self._make_key_widget)
+        self._add_keys(keys)
+        super().__init__(VirtualListBox(self._w_walker))
+
+    def _make_key_widget(self, pos):
+        key = self._keys[pos]
+        return _KeyWidget(
+            key, self._keymap.key_scancodes(key) if self._keymap else None,
+            cb_add=self._cb_add, cb_clear=self._cb_clear,
+        )
+
+    def _add_keys(self, keys, new_set_focus=False):
+        n = len(self._keys)
+        for key in keys:
+            if key not in self._key_pos:
+                self._key_pos[key] = len(self._keys)
+                self._keys.append(key)
+        if len(self._keys) != n:
+            self._w_walker.set_size(len(self._keys))
             if new_set_focus:
-                self._w_walker.set_focus(len(self._w_walker) - 1)
+                self._w_walker.set_focus(len(self._keys) - 1)
 
     def set_from_keymap(self, keymap: RCKeymap, new_set_focus=False):
-        self.set_key_scodes(keymap.all_scancodes_by_key(), new_set_focus)
+        self._keymap = keymap
+        # update visible rows in place, others are created when needed
+        for key, pos in self._key_pos.items():
+            if w := self._w_walker.cached(pos):
+                w.set_scodes(keymap.key_scancodes(key))
+        self._add_keys(keymap.keys(), new_set_focus)
+
+    def update_keys(self, keymap: RCKeymap, keys: typing.Iterable[str], new_set_focus=False):
+        # update only some keys (incremental)
+        self._keymap = keymap
+        keys = list(keys)
+        for key in keys:
+            if key in self._key_pos and (w := self._w_walker.cached(self._key_pos[key])):
+                w.set_scodes(keymap.key_scancodes(key))
+        self._add_keys(keys, new_set_focus)
 
 
 class _KeyAddWidget(urwid.Pile):
-    _all_keys = {
-        k: k[4:] for v in evdev.ecodes.keys.values() for k in (v if isinstance(v, tuple) else (v, ))
-    }
-
-    def __init__(self, *, cb_key_add: typing.Callable):
+    _all_keys = None
+    _index_n = 3
+    _index = None
+    _order = None
+
+    @classmethod
+    def _keys(cls):
+        # key names (without KEY_), built on first use
+        if cls._all_keys is None:
+            cls._all_keys = {
+                k: k[4:] for v in evdev.ecodes.keys.values() for k in (v if isinstance(v, tuple) else (v, ))
+            }
+        return cls._all_keys
+
+    @classmethod
+    def _key_index(cls):
+        # n-gram index (all substrings up to _index_n) over the key names
+        # built once, maps each n-gram to the keys that contain it
+        if cls._index is None:
+            all_keys = cls._keys()
+            cls._order = {k: i for i, k in enumerate(all_keys)}
+            cls._index = {}
+            for k, name in all_keys.items():
+                for n in range(1, cls._index_n + 1):
+                    for i in range(len(name) - n + 1):
+                        cls._index.setdefault(name[i:i + n], set()).add(k)
+        return cls._index
+
+    def __init__(self, *, cb_key_add: typing.Callable, cb_draw_screen: typing.Callable | None = None, debounce=0.15):
         self._cb_key_add = cb_key_add
+        self._cb_draw_screen = cb_draw_screen
+        self._debounce = debounce
+        self._debounce_handle = None
+        self._last_text = None
+        self._last_keys = []
+        self._last_shown = None
+        self._buttons = {}
         self.w_info = urwid.Text('')
         self.w_grid = None
         self.w_edit = urwid.Edit('Search for a key to add: ')
@@ -234,7 +541,38 @@ class _KeyAddWidget(urwid.Pile):
         self.w_edit.set_edit_text('')
 
     def _on_change(self, w, text):
+        if self._debounce_handle:
+            self._debounce_handle.cancel()
+            self._debounce_handle = None
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            loop = None
+        if not text or not loop or self._debounce <= 0:
+            self._refresh(text)
+            return
+
+        # only the last change in a burst (typing) triggers a refresh
+        def cb():
+            self._debounce_handle = None
+            self._refresh(text)
+            if self._cb_draw_screen:
+                self._cb_draw_screen()
+        self._debounce_handle = loop.call_later(self._debounce, cb)
+
+    def _button(self, key):
+        # buttons are reused between refreshes
+        if key not in self._buttons:
+            w = urwid.Button(key)
+            urwid.connect_signal(w, 'click', lambda w: self._cb_key_add(key))
+            self._buttons[key] = w, ('given', len(key) + 4)
+        return self._buttons[key]
+
+    def _refresh(self, text):
         keys = self._search_keys(text) if text else []
+        if keys == self._last_shown:
+            return
+        self._last_shown = keys
         self.w_info.set_text(
             ('ss.cyan.fg', '(select a key to add)') if keys else '',
         )
@@ -244,23 +582,31 @@ class _KeyAddWidget(urwid.Pile):
             self.w_grid = None
             return
 
-        def btn(key):
-            w = urwid.Button(key)
-            urwid.connect_signal(w, 'click', lambda w: self._cb_key_add(key))
-            return w
-
         if not self.w_grid:
             self.w_grid = urwid.GridFlow([], 0, 1, 0, align='center')
             self.contents.append((self.w_grid, ('pack', None)))
-        self.w_grid.contents = [(btn(k), ('given', len(k) + 4)) for k in keys]
+        self.w_grid.contents = [self._button(k) for k in keys]
 
     def _search_keys(self, text: str, max=20):
         text = text.upper()
-        res = []
-        for k, n in __class__._all_keys.items():
-            if text in n:
-                res.append(k)
-        res.sort(key=len)
+        if self._last_text and text.startswith(self._last_text):
+            # query grew, narrow the previous results
+            candidates = self._last_keys
+        else:
+            index = __class__._key_index()
+            n = min(len(text), __class__._index_n)
+            grams = sorted(
+                (index.get(text[i:i + n], set()) for i in range(len(text) - n + 1)),
+                key=len,
+            )
+            candidates = set.intersection(*grams) if grams else set()
+            # sorted by length (same order as a full scan)
+            order = __class__._order
+            candidates = sorted(candidates, key=lambda k: (len(k), order[k]))
+        all_keys = __class__._keys()
+        res = [k for k in candidates if text in all_keys[k]]
+        self._last_text = text
+        self._last_keys = res
         return res[:max]
 
 
@@ -302,9 +648,10 @@ class RCKeymapConfigurator():
         )
         self._key_add_widget = _KeyAddWidget(
             cb_key_add=lambda key: self._monitor_start(key),
+            cb_draw_screen=self._cb_draw_screen,
         )
         self._key_list_widget = _KeyListWidget(
-            {k: [] for k in self._default_keys},
+            self._default_keys,
             cb_add=(
                 lambda key: self._monitor_start(key)
             ) if self._dev_lirc else None,
@@ -356,9 +703,11 @@ class RCKeymapConfigurator():
 
     def _cb_monitor_done(self, key: str, scode=None):
         if scode:
-            self._update_key(key, scode)
-            self._set_footer(urwid.Text(('ss.green.fg', 'Added code %s to %s.' % (
-                _KeyWidget._fmr_sc(scode), key)), align='center'))
+            prev = self._update_key(key, scode)
+            t = 'Added code %s to %s.' % (_KeyWidget._fmr_sc(scode), key)
+            if prev and prev != key:
+                t = 'Moved code %s from %s to %s.' % (_KeyWidget._fmr_sc(scode), prev, key)
+            self._set_footer(urwid.Text(('ss.green.fg', t), align='center'))
         else:
             self._set_footer(None)
         self._cb_draw_screen()
@@ -415,11 +764,15 @@ class RCKeymapConfigurator():
 
     def _update_key(self, key, scode):
         self._changed = True
+        prev = None
         if scode:
-            self._keymap.set_scancode(scode[0], scode[1], key)
+            prev = self._keymap.set_scancode(scode[0], scode[1], key)
         else:
             self._keymap.clear_key_scancodes(key)
-        self._key_list_widget.set_from_keymap(self.keymap, True)
+        # the scancode may have been moved from another key
+        keys = [key, prev] if prev and prev != key else [key]
+        self._key_list_widget.update_keys(self.keymap, keys, True)
+        return prev
 
     def update(self):
         self._key_add_widget.clear()
@@ -5,10 +5,10 @@ from .linux import rc
 from .pkg import evdev
 
 
-async def rc_monitor(dev: rc.RCDevice, *, cb_lirc=None, cb_event=None, cb_start=None):
+async def rc_monitor(dev: rc.RCDevice, *, cb_lirc=None, cb_event=None, cb_start=None, cb_flush=None):
     if cb_lirc and not (dev_lirc := dev.lirc0):
         cb_lirc = None
-    if cb_event and not dev.input0 or not (dev_event := dev.input0.event0):
+    if cb_event and not (dev.input0 and (dev_event := dev.input0.event0)):
         cb_event = None
 
     with (
@@ -30,6 +30,8 @@ async def rc_monitor(dev: rc.RCDevice, *, cb_lirc=None, cb_event=None, cb_start=
                     while scs := await lirc_io.read():
                         for sc in scs:
                             cb_lirc(dev, stop, sc)
+                        if cb_flush:
+                            cb_flush(dev)
 
         async def read_event():
             if event_io:
@@ -37,6 +39,8 @@ async def rc_monitor(dev: rc.RCDevice, *, cb_lirc=None, cb_event=None, cb_start=
                     while evs := await event_io.async_read():
                         for ev in evs:
                             cb_event(dev, stop, ev)
+                        if cb_flush:
+                            cb_flush(dev)
 
         if cb_start:
             cb_start(dev, stop, proto_org, proto_err)